@@ -17,3 +17,7 @@ def login_route(request: LoginRequest):
     return_val = login(request)
     return return_val
 
+@router.post("/admin/revoke/{user_id}", dependencies=[Depends(require_admin)])
+def revoke_user_route(user_id: str):
+    return_val = revoke_user_access(user_id)
+    return return_val
@@ -2,7 +2,7 @@ from fastapi import HTTPException
 import bcrypt
 import uuid
 
-from db.crud import insert_user, user_exists, find_use_username
+from db.crud import insert_user, user_exists, find_use_username, user_id_exists
 from schemas.auth_Models import LoginRequest, CreateUserRequest
 from config.security import *
 
@@ -30,4 +30,12 @@ def login(request: LoginRequest):
         raise HTTPException(status_code=400, detail="Invalid Username or Password" )
     
     token = create_access_token({"user_id": user.user_id})
-    return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": token, "token_type": "bearer"}
+
+
+def revoke_user_access(user_id: str):
+    if not user_id_exists(user_id):
+        raise HTTPException(status_code=404, detail="User is not found")
+
+    revoke_user(user_id)
+    return {"Action": "Tokens Revoked", "user_id": user_id}
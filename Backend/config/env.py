@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@lru_cache()
+def load_env():
+    """Load the .env file once per process, no matter how many modules ask for it."""
+    load_dotenv()
+    return True
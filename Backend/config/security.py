@@ -1,12 +1,19 @@
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from datetime import datetime, timedelta, timezone
-from cryptography.fernet import Fernet
 import os
-from fastapi import HTTPException, Depends
-from dotenv import load_dotenv
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from fastapi import HTTPException, Depends, Header
 
-load_dotenv()
+from config.env import load_env
+from db.crud import get_token_revoked_at, revoke_user_tokens, get_user_rag_ids, check_rag_owner
+
+load_env()
 
 SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = "HS256"
@@ -20,8 +27,9 @@ oauth2_scheme = HTTPBearer(description="Paste your JWT token ")
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     # Use timezone-aware datetime
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now})
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
@@ -37,17 +45,160 @@ def verify_token(token: str):
         return None
 
 
-def get_current_user_token(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
-    # Extract the token string from the credentials object
-    token_string = credentials.credentials
-    user_id = verify_token(token_string)
-    if not user_id:
-        # This exception detail is critical for debugging
+# VERIFIED TOKEN CACHE
+# Verified tokens are cached by hash until their `exp` (capped by
+# PRINCIPAL_CACHE_TTL) together with the user's owned RAG ids, so a request
+# skips jwt.decode and the SQLite ownership lookups. The cache is per worker,
+# so revocation lives in the DB (token_revocation, plus the users row itself):
+# a cached principal is rechecked against it at most every
+# REVOCATION_CHECK_SECONDS, which bounds how long a revoked or deleted user's
+# token keeps working on any worker.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+REVOCATION_CHECK_SECONDS = float(os.getenv("REVOCATION_CHECK_SECONDS", "5"))
+
+
+@dataclass
+class Principal:
+    user_id: str
+    expires_at: float
+    rag_ids: set[str] = field(default_factory=set)
+    issued_at: float = 0.0
+    checked_at: float = 0.0
+
+    def owns(self, rag_id: str) -> bool:
+        if rag_id in self.rag_ids:
+            return True
+        # Cached ids go stale when another worker creates a RAG; confirm in the DB
+        if check_rag_owner(self.user_id, rag_id):
+            self.rag_ids.add(rag_id)
+            return True
+        return False
+
+    def forget(self, rag_id: str):
+        self.rag_ids.discard(rag_id)
+
+
+_token_cache: OrderedDict[str, Principal] = OrderedDict()
+_user_tokens: dict[str, set[str]] = {}
+_token_cache_lock = threading.Lock()
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _drop_token(key: str):
+    principal = _token_cache.pop(key, None)
+    if principal is not None:
+        keys = _user_tokens.get(principal.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _user_tokens[principal.user_id]
+
+
+def _cache_principal(key: str, principal: Principal):
+    with _token_cache_lock:
+        _drop_token(key)
+        _token_cache[key] = principal
+        _user_tokens.setdefault(principal.user_id, set()).add(key)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _drop_token(next(iter(_token_cache)))
+
+
+def _cached_principal(key: str):
+    with _token_cache_lock:
+        principal = _token_cache.get(key)
+        if principal is None:
+            return None
+        if principal.expires_at <= time.time():
+            _drop_token(key)
+            return None
+        _token_cache.move_to_end(key)
+        return principal
+
+
+def invalidate_user(user_id: str):
+    """Drop every cached principal for a user (e.g. after their RAGs change)."""
+    with _token_cache_lock:
+        for key in list(_user_tokens.get(user_id, ())):
+            _drop_token(key)
+
+
+def revoke_user(user_id: str):
+    """Reject every token issued to a user so far, on all workers.
+
+    This worker drops its cached principals immediately; the others see the
+    revocation on their next recheck (within REVOCATION_CHECK_SECONDS).
+    """
+    revoke_user_tokens(user_id, time.time())
+    invalidate_user(user_id)
+
+
+def _token_valid(user_id: str, issued_at: float) -> bool:
+    revoked_at = get_token_revoked_at(user_id)
+    return revoked_at is not None and issued_at >= revoked_at
+
+
+def load_principal(token: str):
+    """Verify a token and return its Principal, using the cache when possible."""
+    key = _token_key(token)
+    principal = _cached_principal(key)
+    if principal is not None:
+        now = time.time()
+        if now - principal.checked_at < REVOCATION_CHECK_SECONDS:
+            return principal
+        if not _token_valid(principal.user_id, principal.issued_at):
+            with _token_cache_lock:
+                _drop_token(key)
+            return None
+        principal.checked_at = now
+        return principal
+
+    try:
+        decoded = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        print("Token has expired")  # Debug logging
+        return None
+    except jwt.InvalidTokenError as e:
+        print(f"Invalid token: {e}")  # Debug logging
+        return None
+
+    user_id = decoded.get("user_id")
+    # Tokens issued before `iat` was added count as issued at 0, so any revocation covers them
+    issued_at = float(decoded.get("iat", 0))
+    if not user_id or not _token_valid(user_id, issued_at):
+        return None
+
+    now = time.time()
+    expires_at = min(float(decoded.get("exp", 0)), now + PRINCIPAL_CACHE_TTL)
+    principal = Principal(user_id=user_id, expires_at=expires_at, rag_ids=set(get_user_rag_ids(user_id)),
+                          issued_at=issued_at, checked_at=now)
+    _cache_principal(key, principal)
+    return principal
+
+
+def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
+    principal = load_principal(credentials.credentials)
+    if principal is None:
         raise HTTPException(
             status_code=401, 
             detail="Invalid or expired token. Check server logs for details."
         )
-    return user_id
+    return principal
+
+
+def get_current_user_token(principal: Principal = Depends(get_current_principal)):
+    return principal.user_id
+
+
+# Operator-only endpoints (GC, maintenance) are guarded by a shared token.
+# They are disabled entirely when ADMIN_TOKEN is not set.
+def require_admin(x_admin_token: str = Header(None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 
 
@@ -62,6 +213,8 @@ def load_key():
     return open(key_path, "rb").read()
 
 def encrypt_key(raw_key: str):
+    from cryptography.fernet import Fernet
+
     key = load_key()
     f = Fernet(key)
 
@@ -71,6 +224,8 @@ def encrypt_key(raw_key: str):
     return encrypted
 
 def decrypt_key(encrypted_key: str):
+    from cryptography.fernet import Fernet
+
     key = load_key()
     f = Fernet(key)
     decrypted = f.decrypt(encrypted_key).decode()
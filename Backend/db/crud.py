@@ -1,7 +1,7 @@
-import shutil
 from db.models import *
 from db.database import *
 import os 
+import json
 
 BASE_DIR = "rag_data"
 CHROMA_DIR = "./chroma_data" 
@@ -43,16 +43,37 @@ def user_id_exists(user_id: str) -> bool:
     session.close()
     return user
 
+def get_token_revoked_at(user_id: str) -> float | None:
+    """None if the user no longer exists, else when their tokens were last revoked (0.0 if never)."""
+    with SessionLocal() as session:
+        row = session.query(User.user_id, Token_Revocation.revoked_at).outerjoin(
+            Token_Revocation, Token_Revocation.user_id == User.user_id
+        ).filter(User.user_id == user_id).first()
+        if row is None:
+            return None
+        return row.revoked_at or 0.0
+
+def revoke_user_tokens(user_id: str, revoked_at: float):
+    from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(Token_Revocation).values(user_id=user_id, revoked_at=revoked_at)
+    stmt = stmt.on_conflict_do_update(index_elements=["user_id"], set_={"revoked_at": revoked_at})
+    with SessionLocal() as session:
+        session.execute(stmt)
+        session.commit()
+
 
 
 
 #### RAG HELPERS
 
-def delete_rag_by_id(user_id: str, rag_id: str):
-    collection_name = f"{user_id}_{rag_id}"
-    rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
-    chroma_path = os.path.join(CHROMA_DIR, collection_name)
+def delete_rag_by_id(user_id: str, rag_id: str, purge: bool = True):
+    """
+    Delete a RAG's row, then (unless purge=False) its vectors and files.
 
+    Storage is removed after the row is committed; anything left behind by a
+    failed purge is reclaimed by utils.storage_gc.run_gc.
+    """
     # Delete from DB
     with SessionLocal() as session:
         rag_to_delete = session.query(Rag_Table).filter(
@@ -67,28 +88,26 @@ def delete_rag_by_id(user_id: str, rag_id: str):
         else:
             db_deleted = False
 
-    # Delete from Filesystem
-    if os.path.exists(rag_dir):
-        shutil.rmtree(rag_dir)
+    if not purge:
+        return db_deleted, False, False
 
-        # debug statement
-        print(f"Deleted user RAG data directory: {rag_dir}")
-        files_deleted = True 
-    else:
-        files_deleted = False 
-    
-    #Delete Chroma Dir
-    if os.path.exists(chroma_path):
-        shutil.rmtree(chroma_path)
-
-        #debug statement
-        print(f"Deleted Chroma collection directory: {chroma_path}")
-        chroma_deleted = True
-    else:
-        chroma_deleted = False
+    # Delete files and drop the collection through the vector store API
+    from utils.storage_gc import purge_rag_storage
+
+    files_deleted, chroma_deleted = purge_rag_storage(user_id, rag_id)
 
     return db_deleted, files_deleted, chroma_deleted
 
+def delete_rags_for_user(user_id: str) -> list[str]:
+    """Delete every RAG row owned by a user in one transaction. Returns the deleted ids."""
+    with SessionLocal() as session:
+        rags = session.query(Rag_Table).filter(Rag_Table.user_id == user_id).all()
+        rag_ids = [r.rag_id for r in rags]
+        for rag in rags:
+            session.delete(rag)
+        session.commit()
+    return rag_ids
+
 def insert_rag(rag_id: str, user_id: str, rag_name: str, model: str, key: str, documents):
     session = SessionLocal()
     rag = Rag_Table(rag_id=rag_id, user_id=user_id, rag_name=rag_name, model=model, key=key, documents=documents)
@@ -98,12 +117,32 @@ def insert_rag(rag_id: str, user_id: str, rag_name: str, model: str, key: str, d
     session.close()
     return rag
 
+def add_rag_documents(rag_id: str, paths: list[str]) -> int:
+    """Merge file paths into a RAG's documents list. Returns the new total."""
+    with SessionLocal() as session:
+        rag_row = session.query(Rag_Table).filter(Rag_Table.rag_id == rag_id).first()
+
+        if rag_row.documents:
+            existing_docs = json.loads(rag_row.documents)
+        else:
+            existing_docs = []
+        updated_docs = list(set(existing_docs + paths))
+
+        rag_row.documents = json.dumps(updated_docs)
+        session.commit()
+        return len(updated_docs)
+
 def rag_exists(rag_id: str):
     session = SessionLocal()
     rag = session.query(Rag_Table).filter(Rag_Table.rag_id == rag_id).first() is not None
     session.close()
     return rag
 
+def get_user_rag_ids(user_id: str) -> list[str]:
+    with SessionLocal() as session:
+        rows = session.query(Rag_Table.rag_id).filter(Rag_Table.user_id == user_id).all()
+        return [row.rag_id for row in rows]
+
 def check_rag_owner(cur_user_id, rag_id: str):
     with SessionLocal() as session:
         rag = session.query(Rag_Table).filter(Rag_Table.rag_id == rag_id).first()
@@ -126,4 +165,118 @@ def get_rag_json(rag_id: str):
     }
 
     else:
-        return None
\ No newline at end of file
+        return None
+
+
+#### USAGE HELPERS
+
+USAGE_COUNTERS = (
+    "queries",
+    "llm_calls",
+    "llm_calls_skipped",
+    "prompt_tokens",
+    "completion_tokens",
+    "embedding_calls",
+    "embedding_cache_hits",
+    "chunks_ingested",
+)
+
+def add_usage(rows: list[dict]):
+    """Add counter deltas to usage_table in one statement (insert or increment)."""
+    if not rows:
+        return
+    from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(Usage_Table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "rag_id", "period"],
+        set_={c: getattr(Usage_Table, c) + getattr(stmt.excluded, c) for c in USAGE_COUNTERS},
+    )
+    with SessionLocal() as session:
+        session.execute(stmt)
+        session.commit()
+
+def get_usage_rows(user_id: str, rag_id: str | None = None, since: str | None = None):
+    with SessionLocal() as session:
+        query = session.query(Usage_Table).filter(Usage_Table.user_id == user_id)
+        if rag_id is not None:
+            query = query.filter(Usage_Table.rag_id == rag_id)
+        if since is not None:
+            query = query.filter(Usage_Table.period >= since)
+        return query.order_by(Usage_Table.period).all()
+
+
+#### RESIDENCY HELPERS
+
+def get_residency(collection_name: str):
+    with SessionLocal() as session:
+        return session.get(Rag_Residency, collection_name)
+
+def record_residency_access(accesses: dict[str, float]):
+    """Upsert last-access times for many collections at once."""
+    if not accesses:
+        return
+    from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(Rag_Residency).values([
+        {"collection_name": name, "last_accessed": ts, "tier": "hot"}
+        for name, ts in accesses.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["collection_name"],
+        set_={"last_accessed": stmt.excluded.last_accessed},
+    )
+    with SessionLocal() as session:
+        session.execute(stmt)
+        session.commit()
+
+def set_residency_tier(collection_name: str, tier: str, cold_path: str | None = None,
+                       cold_bytes: int | None = None, cold_vectors: int | None = None):
+    with SessionLocal() as session:
+        row = session.get(Rag_Residency, collection_name)
+        if row is None:
+            import time
+
+            row = Rag_Residency(collection_name=collection_name, last_accessed=time.time())
+            session.add(row)
+        row.tier = tier
+        row.cold_path = cold_path
+        row.cold_bytes = cold_bytes
+        row.cold_vectors = cold_vectors
+        session.commit()
+
+def set_residency_size(collection_name: str, vectors: int, dim: int | None):
+    """Record a collection's vector count and dimension (dim is kept when None)."""
+    import time
+    from sqlalchemy.dialects.sqlite import insert
+
+    values = {"vectors": vectors}
+    if dim:
+        values["dim"] = dim
+    stmt = insert(Rag_Residency).values(collection_name=collection_name, last_accessed=time.time(),
+                                        tier="hot", **values)
+    stmt = stmt.on_conflict_do_update(index_elements=["collection_name"], set_=values)
+    with SessionLocal() as session:
+        session.execute(stmt)
+        session.commit()
+
+def delete_residency(collection_name: str):
+    with SessionLocal() as session:
+        session.query(Rag_Residency).filter(Rag_Residency.collection_name == collection_name).delete()
+        session.commit()
+
+def get_cold_candidates(cutoff: float) -> list[str]:
+    """Hot collections not accessed since `cutoff` (epoch seconds)."""
+    with SessionLocal() as session:
+        rows = session.query(Rag_Residency.collection_name).filter(
+            Rag_Residency.tier == "hot",
+            Rag_Residency.last_accessed < cutoff,
+        ).all()
+        return [row.collection_name for row in rows]
+
+def get_untracked_collections() -> list[str]:
+    """Collection names of RAGs that have no residency row yet."""
+    with SessionLocal() as session:
+        names = [f"{r.user_id}_{r.rag_id}" for r in session.query(Rag_Table.user_id, Rag_Table.rag_id).all()]
+        tracked = {row.collection_name for row in session.query(Rag_Residency.collection_name).all()}
+        return [name for name in names if name not in tracked]
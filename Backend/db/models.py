@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, create_engine, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, create_engine, ForeignKey, Text, Float
 from sqlalchemy.orm import Mapped, sessionmaker, mapped_column, declarative_base, relationship
 
 from db.database import Base
@@ -33,4 +33,57 @@ class Rag_Table(Base):
     user = relationship("User", back_populates="rags")
 
     def __repr__(self):
-        return f"<Rag_Table(rag_id={self.rag_id}, rag_name='{self.rag_name}')>"
\ No newline at end of file
+        return f"<Rag_Table(rag_id={self.rag_id}, rag_name='{self.rag_name}')>"
+
+
+
+class Usage_Table(Base):
+    __tablename__ = "usage_table"
+
+    # One row per user, RAG and day; counters are added to by UsageLedger flushes
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    rag_id: Mapped[str] = mapped_column(String, primary_key=True)
+    period: Mapped[str] = mapped_column(String, primary_key=True)
+
+    queries: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    llm_calls: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    llm_calls_skipped: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    embedding_calls: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    embedding_cache_hits: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    chunks_ingested: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<Usage_Table(user_id={self.user_id}, rag_id={self.rag_id}, period='{self.period}')>"
+
+
+
+class Rag_Residency(Base):
+    __tablename__ = "rag_residency"
+
+    # Keyed by Chroma collection name (<user_id>_<rag_id>)
+    collection_name: Mapped[str] = mapped_column(String, primary_key=True)
+    last_accessed: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    tier: Mapped[str] = mapped_column(String, nullable=False, default="hot")
+    cold_path: Mapped[str] = mapped_column(String, nullable=True)
+    cold_bytes: Mapped[int] = mapped_column(Integer, nullable=True)
+    cold_vectors: Mapped[int] = mapped_column(Integer, nullable=True)
+    # Recorded whenever vectors are written, so storage can be reported without opening the collection
+    vectors: Mapped[int] = mapped_column(Integer, nullable=True)
+    dim: Mapped[int] = mapped_column(Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<Rag_Residency(collection_name={self.collection_name}, tier='{self.tier}')>"
+
+
+
+class Token_Revocation(Base):
+    __tablename__ = "token_revocation"
+
+    # Tokens for this user issued before revoked_at are rejected by every worker
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    revoked_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<Token_Revocation(user_id={self.user_id}, revoked_at={self.revoked_at})>"
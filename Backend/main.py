@@ -1,20 +1,55 @@
+from contextlib import asynccontextmanager
+import os
+import threading
+
 from fastapi import FastAPI
 
 from config.cors import setup_cors
 from rag.routes import router as rag_router
 from auth.routes import router as auth_router
+from usage.routes import router as usage_router
+from usage.ledger import usage_ledger
+from utils.residency import residency_manager
 from db.database import *
+from db.models import *
+from utils.rag_utilities import warm_up, persist_query_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here instead of at import time so the process can
+    # bind its port as soon as possible.
+    Base.metadata.create_all(engine)
+
+    # Usage counters are buffered in memory and flushed in batches
+    usage_ledger.start()
+
+    # Idle collection unloading and cold-tier demotion
+    residency_manager.start()
 
-app = FastAPI()
+    # Optional background warm-up: import provider SDKs and open Chroma while
+    # the worker is already accepting requests.
+    if os.getenv("WARMUP_ON_STARTUP", "0") == "1":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
-Base.metadata.create_all(engine)
+    yield
+
+    residency_manager.stop()
+    usage_ledger.stop()
+
+    # Keep hot query embeddings across restarts (QUERY_EMBED_CACHE_PATH).
+    persist_query_cache()
+
+
+app = FastAPI(lifespan=lifespan)
 
 setup_cors(app)
 
 app.include_router(auth_router, prefix="/auth")
+app.include_router(rag_router)
+app.include_router(usage_router)
 
 
 @app.get("/")
 def home():
     return {"Hello": "World"}
-
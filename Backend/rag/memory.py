@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+# Server-side conversation memory for /rag/{RAG_id}/sessions/{id}/query.
+# Each session keeps a rolling summary plus the most recent turns, and older
+# turns are folded into the summary so the history sent to the LLM stays
+# within HISTORY_TOKEN_BUDGET no matter how long the conversation gets.
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))
+KEEP_RECENT_TURNS = int(os.getenv("KEEP_RECENT_TURNS", "2"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting."""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Hard cap on a piece of text, keeping the most recent part."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:]
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+    def render(self) -> str:
+        return f"User: {self.question}\nAssistant: {self.answer}"
+
+
+@dataclass
+class ConversationSession:
+    session_id: str
+    user_id: str
+    rag_id: str
+    summary: str = ""
+    turns: list[Turn] = field(default_factory=list)
+    turn_count: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    # Serializes summary updates between concurrent requests on the same session
+    compaction_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+
+    def render_history(self) -> str:
+        """History block for prompts: rolling summary followed by recent turns."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if self.turns:
+            parts.append("\n".join(turn.render() for turn in self.turns))
+        return "\n\n".join(parts)
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.render_history())
+
+    def needs_compaction(self) -> bool:
+        return (
+            self.history_tokens() > HISTORY_TOKEN_BUDGET
+            and len(self.turns) > KEEP_RECENT_TURNS
+        )
+
+    def turns_to_fold(self) -> list[Turn]:
+        """Oldest turns that should be merged into the summary."""
+        return self.turns[:len(self.turns) - KEEP_RECENT_TURNS]
+
+    def fold(self, new_summary: str, folded: list[Turn]):
+        """Replace the summary and drop exactly the turns that were folded into it."""
+        # The summary gets at most half of the budget so recent turns always fit.
+        self.summary = truncate_to_tokens(new_summary.strip(), HISTORY_TOKEN_BUDGET // 2)
+        # By identity: turns added while the summary was being written stay
+        folded_ids = {id(turn) for turn in folded}
+        self.turns = [turn for turn in self.turns if id(turn) not in folded_ids]
+
+    def add_turn(self, question: str, answer: str):
+        self.turns.append(Turn(question=question, answer=answer))
+        self.turn_count += 1
+
+
+class SessionStore:
+    """Bounded in-memory session store with LRU + TTL eviction."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: OrderedDict[tuple, ConversationSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        expired = [key for key, s in self._sessions.items() if now - s.last_used > self.ttl_seconds]
+        for key in expired:
+            del self._sessions[key]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id: str, user_id: str, rag_id: str) -> ConversationSession:
+        key = (user_id, rag_id, session_id)
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or now - session.last_used > self.ttl_seconds:
+                session = ConversationSession(session_id=session_id, user_id=user_id, rag_id=rag_id)
+                self._sessions[key] = session
+            session.last_used = now
+            self._sessions.move_to_end(key)
+            self._evict(now)
+            return session
+
+    def delete(self, session_id: str, user_id: str, rag_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop((user_id, rag_id, session_id), None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+session_store = SessionStore()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, UploadFile, File, Form
 from config.security import *
 
 
@@ -6,6 +6,7 @@ from schemas.rag_Models import (
     CreateRAGResponse,
     RagListItem,
     RAGQueryRequest,
+    PrewarmRequest,
 )
 
 from rag.service import *
@@ -17,8 +18,28 @@ async def create_RAG_route(RAG_name: str = Form(...),
                     Model: str = Form(...),
                     key: str = Form(...),
                     documents: list[UploadFile] = File(...),
-                    current_user_id: str = Depends(get_current_user_token)):
-    return_val = await create_RAG(RAG_name, Model, key, documents, current_user_id)
+                    tags: str = Form(None),
+                    principal: Principal = Depends(get_current_principal)):
+    return_val = await create_RAG(RAG_name, Model, key, documents, principal, tags)
+    return return_val
+
+
+@router.post("/import")
+async def import_rag_route(snapshot: UploadFile = File(...),
+                    key: str = Form(...),
+                    RAG_name: str = Form(None),
+                    Model: str = Form(None),
+                    principal: Principal = Depends(get_current_principal)):
+    return_val = await import_rag(snapshot, key, RAG_name, Model, principal)
+    return return_val
+
+
+@router.get("/{RAG_id}/export")
+def export_rag_route(
+    RAG_id: str,
+    principal: Principal = Depends(get_current_principal),
+):
+    return_val = export_rag(RAG_id, principal)
     return return_val
 
 
@@ -26,9 +47,28 @@ async def create_RAG_route(RAG_name: str = Form(...),
 async def query_rag_route(
     RAG_id: str,
     request: RAGQueryRequest,
-    current_user_id: str = Depends(get_current_user_token),
+    principal: Principal = Depends(get_current_principal),
+):
+    return_val = await query_rag(RAG_id, request, principal)
+    return return_val
+
+@router.post("/{RAG_id}/sessions/{session_id}/query")
+async def session_query_rag_route(
+    RAG_id: str,
+    session_id: str,
+    request: RAGQueryRequest,
+    principal: Principal = Depends(get_current_principal),
 ):
-    return_val = await query_rag(RAG_id, request, current_user_id)
+    return_val = await session_query_rag(RAG_id, session_id, request, principal)
+    return return_val
+
+@router.delete("/{RAG_id}/sessions/{session_id}", status_code=204)
+def delete_session_route(
+    RAG_id: str,
+    session_id: str,
+    principal: Principal = Depends(get_current_principal),
+):
+    return_val = delete_session(RAG_id, session_id, principal)
     return return_val
 
 @router.post("/{RAG_id}/file_query")
@@ -36,9 +76,15 @@ async def file_query_rag_route(
     RAG_id: str,
     query: str = Form(...),
     file: UploadFile = File(None),
-    current_user_id: str = Depends(get_current_user_token),
+    principal: Principal = Depends(get_current_principal),
     ):
-    return_val = await file_query_rag(RAG_id, query, file, current_user_id)
+    return_val = await file_query_rag(RAG_id, query, file, principal)
+    return return_val
+
+
+@router.post("/admin/{RAG_id}/prewarm", dependencies=[Depends(require_admin)])
+def prewarm_rag_queries_route(RAG_id: str, request: PrewarmRequest):
+    return_val = prewarm_rag_queries(RAG_id, request)
     return return_val
 
 
@@ -46,21 +92,40 @@ async def file_query_rag_route(
 async def add_documents_to_rag_route(
             RAG_id: str,
             new_documents: list[UploadFile] = File(...),
-            current_user_id = Depends(get_current_user_token)
+            tags: str = Form(None),
+            principal: Principal = Depends(get_current_principal)
 ):
-    return_val = await add_documents_to_rag(RAG_id, new_documents, current_user_id)
+    return_val = await add_documents_to_rag(RAG_id, new_documents, principal, tags)
     return return_val
 
 @router.get("/list", response_model=list[RagListItem])
 def get_all_rag_route(
-    current_user_id: str = Depends(get_current_user_token)
+    principal: Principal = Depends(get_current_principal)
     ):
-    return_val = get_all_rag(current_user_id)
+    return_val = get_all_rag(principal)
+    return return_val
+
+@router.delete("/delete_all")
+def delete_all_rags_route(background_tasks: BackgroundTasks,
+                principal: Principal = Depends(get_current_principal)
+            ):
+    return_val = delete_all_rags(background_tasks, principal)
     return return_val
 
 @router.delete("/delete/{rag_id}", status_code=204)
 def delete_rag_route(rag_id: str,
-                current_user_id: str = Depends(get_current_user_token)
+                background_tasks: BackgroundTasks,
+                principal: Principal = Depends(get_current_principal)
             ):
-    return_val = delete_rag(rag_id, current_user_id)
+    return_val = delete_rag(rag_id, background_tasks, principal)
+    return return_val
+
+@router.post("/admin/gc", dependencies=[Depends(require_admin)])
+def storage_gc_route(dry_run: bool = False, compact: bool = False):
+    return_val = run_storage_gc(dry_run, compact)
+    return return_val
+
+@router.get("/admin/residency", dependencies=[Depends(require_admin)])
+def residency_metrics_route():
+    return_val = get_residency_metrics()
     return return_val
@@ -1,46 +1,101 @@
-from fastapi import FastAPI, APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException
 from typing import Optional, List
 from config.security import *
 import uuid
 import os 
 import json 
+import shutil
+import time
+import tarfile
+import zlib
 
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
-from langchain_aws import ChatBedrock
-from langchain_chroma import Chroma
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
-from langchain_core.documents import Document
-
-from schemas.rag_Models import CreateRAGResponse, RagListItem, RAGQueryRequest
+from schemas.rag_Models import CreateRAGResponse, RagListItem, RAGQueryRequest, PrewarmRequest
 from db.crud import *
 from db.database import *
 from db.models import * 
 
 from utils.File_Class import PrepareFile 
+from utils.ingest import IngestionPipeline
 from utils.docExtract import extract_text_from_file
+from utils.metadata_filters import build_chroma_filter, parse_tags
+from utils.retrieval import adaptive_retrieve, NO_RELEVANT_DOCUMENTS
+from utils.snapshot import SnapshotError, iter_snapshot, read_manifest, load_snapshot_batches
+from utils.residency import residency_manager
+from utils.storage_gc import BACKGROUND_DELETE_BYTES, purge_rag_storage, rag_storage_bytes, run_gc
+from rag.memory import session_store, estimate_tokens
+from usage.ledger import set_usage_scope, record_usage, usage_ledger
+
+from utils.rag_utilities import get_embeddings, get_rag_collection, get_chroma_client, collection_cache, get_cached_db, db_cache, drop_collection, EMBEDDING_MODEL_ID
+
+
+# LLM_PROVIDER=simulation swaps every RAG's model for the in-process fake (load tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "").lower()
+
+
+def select_model(modelChosen: str, decrypted_key: str):
+    """Build the chat model for a RAG, importing its provider SDK on first use."""
+    if LLM_PROVIDER == "simulation" or modelChosen.lower() == "simulation":
+        from utils.simulation import SimulatedChatModel
+
+        return SimulatedChatModel()
+    elif modelChosen.lower() == "claude":
+        from langchain_aws import ChatBedrock
+
+        return ChatBedrock(
+            model="anthropic.claude-3-sonnet-20240229-v1:0",
+            model_kwargs={"temperature": 0.3},
+        )
+    elif modelChosen.lower() == "openai":
+        from langchain_openai import ChatOpenAI
+
+        os.environ["OPENAI_API_KEY"] = decrypted_key
+        return ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported model type")
+
+
+def get_owned_rag(principal: Principal, RAG_id: str):
+    """Metadata of a RAG owned by the principal; 404 otherwise."""
+    if not principal.owns(RAG_id):
+        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+
+    rag_info = get_rag_json(RAG_id)
+    if rag_info is None:
+        # Deleted (possibly by another worker) after the principal was cached
+        principal.forget(RAG_id)
+        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+    return rag_info
+
+
+async def run_llm(prompt, model, inputs) -> str:
+    """Run prompt | model, record the token usage it reports and return the text."""
+    from langchain_core.output_parsers import StrOutputParser
+
+    message = await (prompt | model).ainvoke(inputs)
+    usage = getattr(message, "usage_metadata", None) or {}
+    record_usage(
+        llm_calls=1,
+        prompt_tokens=usage.get("input_tokens", 0),
+        completion_tokens=usage.get("output_tokens", 0),
+    )
+    return StrOutputParser().invoke(message)
 
-from utils.rag_utilities import get_embeddings, get_rag_collection, chroma_client, collection_cache, get_cached_db, db_cache
 
 async def create_RAG(RAG_name: str = Form(...),
                     Model: str = Form(...),
                     key: str = Form(...),
                     documents: list[UploadFile] = File(...),
-                    current_user_id: str = Depends(get_current_user_token)
+                    principal: Principal = Depends(get_current_principal),
+                    tags: str = Form(None),
                     ):
-    user_id = current_user_id
-    
-    session = SessionLocal()
-    exists = session.query(User).filter(User.user_id == user_id).first() is not None
-    session.close()
-    
-    if not exists:
-        raise HTTPException(status_code=404, detail="User_Id is not found")
+    # The principal is only issued for users that exist
+    user_id = principal.user_id
 
+    upload_tags = parse_tags(tags)
 
-    
     rag_id = str(uuid.uuid4())
     
     rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
@@ -56,15 +111,12 @@ async def create_RAG(RAG_name: str = Form(...),
 
     # Create collection name
     collections_name = f"{user_id}_{rag_id}"
+    uploaded_at = int(time.time())
 
-    # Process and save each file to ChromaDB
-    for file in saved_files:
-        prep = PrepareFile(file)
-        docs = prep.load_documents()
-        chunks = prep.doc_splitter(docs)
-        chunks = prep.id_chunks(chunks)
-
-        prep.save_to_chromadb(chunks, collection_name=collections_name, persist_directory=CHROMA_DIR) 
+    # Parse, embed and write all files to ChromaDB in batched upserts
+    set_usage_scope(user_id, rag_id)
+    pipeline = IngestionPipeline(collections_name, uploaded_at, upload_tags)
+    ingestion_report = await run_in_threadpool(pipeline.run, saved_files)
 
     documents_json = json.dumps(saved_files)
 
@@ -72,65 +124,80 @@ async def create_RAG(RAG_name: str = Form(...),
 
     # Save metadata to rag_table
     insert_rag(rag_id, user_id, RAG_name, Model, encrypted_key, documents_json)
+    # Cached principals carry the owned RAG ids; reload them on the next request
+    invalidate_user(user_id)
 
     rag_metadata = {
         "user_id": user_id,
         "RAG_name": RAG_name,
         "Model": Model,
         #"key": encrypted_key,
-        "documents": saved_files
+        "documents": saved_files,
+        "tags": upload_tags,
     }
 
     with open(os.path.join(rag_dir, "config.json"), "w") as f:
         json.dump(rag_metadata, f, indent=2)
 
-    return {"RAG_id": rag_id, "chromadb": collections_name}
+    return {"RAG_id": rag_id, "chromadb": collections_name, "ingestion": ingestion_report}
 
 
 
 async def query_rag(
     RAG_id: str,
     request: RAGQueryRequest,
-    current_user_id: str = Depends(get_current_user_token),
+    principal: Principal = Depends(get_current_principal),
 ):
     import time
     start_time = time.time()
     
-    user_id = current_user_id
+    user_id = principal.user_id
 
-    if not user_id_exists(user_id):
-        raise HTTPException(status_code=404, detail="User_Id is not found")
+    rag_info = get_owned_rag(principal, RAG_id)
 
-    if not rag_exists(RAG_id) or not check_rag_owner(user_id, RAG_id):
-        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+    set_usage_scope(user_id, RAG_id)
+    record_usage(queries=1)
 
-    rag_info = get_rag_json(RAG_id)
     query_text = request.query
     modelChosen = rag_info["Model"]
 
     collection_name = f"{user_id}_{RAG_id}"
 
-    # Use cached DB instance
-    db = get_cached_db(collection_name)
-    retriever = db.as_retriever(search_kwargs={"k": 3})
-    
+    # Use cached DB instance; metadata filters are applied inside the vector search
+    db = await run_in_threadpool(get_cached_db, collection_name)
+    where = build_chroma_filter(request.filters, user_id, RAG_id)
+
     retrieval_start = time.time()
-    docs = retriever.invoke(query_text)
+    scored_docs = await adaptive_retrieve(db, query_text, where, request)
     retrieval_time = time.time() - retrieval_start
 
+    docs = [doc for doc, _ in scored_docs]
+    scores = [round(score, 4) for _, score in scored_docs]
+
+    # Nothing cleared the relevance threshold: answer without calling the LLM
+    if not docs:
+        record_usage(llm_calls_skipped=1)
+        total_time = time.time() - start_time
+        return {
+            "response": NO_RELEVANT_DOCUMENTS,
+            "model_used": rag_info["Model"],
+            "RAG_name": rag_info["RAG_name"],
+            "documents_retrieved": 0,
+            "relevance_scores": [],
+            "llm_skipped": True,
+            "performance": {
+                "retrieval_time": f"{retrieval_time:.2f}s",
+                "llm_time": "0.00s",
+                "total_time": f"{total_time:.2f}s"
+            }
+        }
+
     decrypted_key = decrypt_key(rag_info["key"])
 
     # Select model
-    if modelChosen.lower() == "claude":
-        model = ChatBedrock(
-            model="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={"temperature": 0.3},
-        )
-    elif modelChosen.lower() == "openai":
-        os.environ["OPENAI_API_KEY"] = decrypted_key
-        model = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported model type")
+    model = select_model(modelChosen, decrypted_key)
+
+    from langchain_core.prompts import ChatPromptTemplate
 
     # Create prompt
     prompt = ChatPromptTemplate.from_template("""
@@ -147,19 +214,12 @@ Answer clearly and rely on the documents provided before using external knowledg
 If the context doesn't contain relevant information, say so.
 """)
 
-    # RAG chain
-    chain = (
-        {
-            "context": retriever | (lambda docs: "\n\n".join([d.page_content for d in docs])),
-            "question": RunnablePassthrough(),
-        }
-        | prompt
-        | model
-        | StrOutputParser()
-    )
-
+    # RAG chain; context comes from the scored retrieval above
     llm_start = time.time()
-    response = chain.invoke(query_text)
+    response = await run_llm(prompt, model, {
+        "context": "\n\n".join([d.page_content for d in docs]),
+        "question": query_text,
+    })
     llm_time = time.time() - llm_start
     
     total_time = time.time() - start_time
@@ -169,6 +229,8 @@ If the context doesn't contain relevant information, say so.
         "model_used": rag_info["Model"],
         "RAG_name": rag_info["RAG_name"],
         "documents_retrieved": len(docs),
+        "relevance_scores": scores,
+        "llm_skipped": False,
         "performance": {
             "retrieval_time": f"{retrieval_time:.2f}s",
             "llm_time": f"{llm_time:.2f}s",
@@ -181,18 +243,16 @@ async def file_query_rag(
     RAG_id: str,
     query: str = Form(...),
     file: UploadFile = File(None),
-    current_user_id: str = Depends(get_current_user_token),
+    principal: Principal = Depends(get_current_principal),
     ):
-    user_id = current_user_id
+    user_id = principal.user_id
 
 
-    if not user_id_exists(user_id):
-        raise HTTPException(status_code=404, detail="User_Id is not found")
+    rag_info = get_owned_rag(principal, RAG_id)
 
-    if not rag_exists(RAG_id) or not check_rag_owner(user_id, RAG_id):
-        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+    set_usage_scope(user_id, RAG_id)
+    record_usage(queries=1)
 
-    rag_info = get_rag_json(RAG_id)
     modelChosen = rag_info["Model"]
 
 
@@ -200,38 +260,36 @@ async def file_query_rag(
 
     embeddings = get_embeddings()
 
-    collection = get_rag_collection(collection_name)
+    collection = await run_in_threadpool(get_rag_collection, collection_name)
 
 
-    db = get_cached_db(collection_name)
-    retriever = db.as_retriever(search_kwargs={"k": 3})
-
-
-    docs = retriever.invoke(query)
+    db = await run_in_threadpool(get_cached_db, collection_name)
+    docs = [doc for doc, _ in await adaptive_retrieve(db, query)]
 
 
     uploaded_document = None
     if file:
+        from langchain_core.documents import Document
+
         uploaded_text = await extract_text_from_file(file)
         if uploaded_text and uploaded_text.strip():
             uploaded_document = Document(page_content=uploaded_text)
             docs.append(uploaded_document)
 
+    if not docs:
+        record_usage(llm_calls_skipped=1)
+        return {
+            "response": NO_RELEVANT_DOCUMENTS,
+            "documents_retrieved": 0,
+            "uploaded_doc_included": False,
+            "llm_skipped": True,
+        }
+
     decrypted_key = decrypt_key(rag_info["key"])
 
-    if modelChosen.lower() == "claude":
-        model = ChatBedrock(
-            model="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={"temperature": 0.3},
-        )
-    elif modelChosen.lower() == "openai":
-        os.environ["OPENAI_API_KEY"] = decrypted_key
-        model = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-        )
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported model type")
+    model = select_model(modelChosen, decrypted_key)
+
+    from langchain_core.prompts import ChatPromptTemplate
 
     prompt = ChatPromptTemplate.from_template("""
 You are a helpful AI assistant.
@@ -249,8 +307,7 @@ If the context doesn't contain relevant information, say so.
     combined_context = "\n\n".join([d.page_content for d in docs])
 
 
-    chain = prompt | model | StrOutputParser()
-    response = chain.invoke({"context": combined_context, "question": query})
+    response = await run_llm(prompt, model, {"context": combined_context, "question": query})
 
     return {
         "response": response,
@@ -259,23 +316,187 @@ If the context doesn't contain relevant information, say so.
     }
 
 
+async def session_query_rag(
+    RAG_id: str,
+    session_id: str,
+    request: RAGQueryRequest,
+    principal: Principal = Depends(get_current_principal),
+):
+    import time
+    start_time = time.time()
+
+    user_id = principal.user_id
+
+    rag_info = get_owned_rag(principal, RAG_id)
+
+    set_usage_scope(user_id, RAG_id)
+    record_usage(queries=1)
+
+    query_text = request.query
+    model = select_model(rag_info["Model"], decrypt_key(rag_info["key"]))
+
+    from langchain_core.prompts import ChatPromptTemplate
+
+    session = session_store.get_or_create(session_id, user_id, RAG_id)
+    history = session.render_history()
+
+    # Rewrite follow-ups ("what about the second one?") into a standalone
+    # question so retrieval does not depend on the conversation history.
+    standalone_query = query_text
+    if history:
+        rewrite_prompt = ChatPromptTemplate.from_template("""
+Given the conversation so far and a follow-up question, rewrite the follow-up
+as a standalone question that can be understood without the conversation.
+Return only the rewritten question.
+
+Conversation:
+{history}
+
+Follow-up question:
+{question}
+""")
+        rewritten = await run_llm(rewrite_prompt, model, {"history": history, "question": query_text})
+        standalone_query = rewritten.strip() or query_text
+
+    collection_name = f"{user_id}_{RAG_id}"
+    db = await run_in_threadpool(get_cached_db, collection_name)
+    where = build_chroma_filter(request.filters, user_id, RAG_id)
+
+    retrieval_start = time.time()
+    docs = [doc for doc, _ in await adaptive_retrieve(db, standalone_query, where, request)]
+    retrieval_time = time.time() - retrieval_start
+
+    prompt = ChatPromptTemplate.from_template("""
+You are a helpful AI assistant.
+Use the provided context and the conversation so far to answer the user's question.
+
+Conversation so far:
+{history}
+
+Context:
+{context}
+
+Question:
+{question}
+
+Answer clearly and rely on the documents provided before using external knowledge.
+If the context doesn't contain relevant information, say so.
+""")
+
+    prompt_inputs = {
+        "history": history or "(no previous turns)",
+        "context": "\n\n".join([d.page_content for d in docs]),
+        "question": query_text,
+    }
+    prompt_tokens = estimate_tokens(prompt.format(**prompt_inputs))
+
+    # Out-of-scope question: record the turn but skip the answer LLM call
+    llm_start = time.time()
+    if docs:
+        response = await run_llm(prompt, model, prompt_inputs)
+    else:
+        response = NO_RELEVANT_DOCUMENTS
+        record_usage(llm_calls_skipped=1)
+    llm_time = time.time() - llm_start
+
+    session.add_turn(query_text, response)
+
+    # Fold the oldest turns into the rolling summary once history exceeds its budget.
+    # One compaction at a time per session; the check is repeated under the lock
+    # because a concurrent request may already have folded these turns.
+    if session.needs_compaction():
+        async with session.compaction_lock:
+            if session.needs_compaction():
+                folded = session.turns_to_fold()
+                summary_prompt = ChatPromptTemplate.from_template("""
+Update the running summary of a conversation with the new turns below.
+Keep names, numbers and decisions; drop small talk. Keep it under 150 words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+""")
+                new_summary = await run_llm(summary_prompt, model, {
+                    "summary": session.summary or "(empty)",
+                    "turns": "\n".join(turn.render() for turn in folded),
+                })
+                session.fold(new_summary, folded)
+
+    total_time = time.time() - start_time
+
+    return {
+        "response": response,
+        "session_id": session_id,
+        "standalone_query": standalone_query,
+        "turns": session.turn_count,
+        "prompt_tokens_estimate": prompt_tokens,
+        "history_tokens": session.history_tokens(),
+        "model_used": rag_info["Model"],
+        "RAG_name": rag_info["RAG_name"],
+        "documents_retrieved": len(docs),
+        "llm_skipped": not docs,
+        "performance": {
+            "retrieval_time": f"{retrieval_time:.2f}s",
+            "llm_time": f"{llm_time:.2f}s",
+            "total_time": f"{total_time:.2f}s"
+        }
+    }
+
+
+def delete_session(
+    RAG_id: str,
+    session_id: str,
+    principal: Principal = Depends(get_current_principal),
+):
+    user_id = principal.user_id
+
+    if not session_store.delete(session_id, user_id, RAG_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return
+
+
+# Upper bound on queries per prewarm call; each uncached one is an embedding request
+PREWARM_MAX_QUERIES = int(os.getenv("PREWARM_MAX_QUERIES", "500"))
+
+
+def prewarm_rag_queries(RAG_id: str, request: PrewarmRequest):
+    """Operator-only: the query cache is shared by every tenant using the same model."""
+    if len(request.queries) > PREWARM_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {PREWARM_MAX_QUERIES} queries per request")
+
+    rag_info = get_rag_json(RAG_id)
+    if rag_info is None:
+        raise HTTPException(status_code=404, detail="RAG not found")
+    user_id = rag_info["user_id"]
+
+    # Embedding calls are billed to the RAG's owner
+    set_usage_scope(user_id, RAG_id)
+
+    # Open the collection wrapper too, so the first real query skips that as well.
+    get_cached_db(f"{user_id}_{RAG_id}")
+
+    # Only the number of new embeddings is returned: whether a query was already
+    # cached would reveal what other tenants have been asking
+    warmed, _ = get_embeddings().prewarm(request.queries)
+
+    return {"warmed": warmed}
+
+
 async def add_documents_to_rag(
             RAG_id: str,
             new_documents: list[UploadFile] = File(...),
-            current_user_id = Depends(get_current_user_token)
+            principal: Principal = Depends(get_current_principal),
+            tags: str = Form(None),
 ):
-    user_id = current_user_id
-
-    #check token credentials 
-    if not user_id_exists(user_id):
-        raise HTTPException(status_code=404, detail="User_Id is not found")
+    user_id = principal.user_id
+    upload_tags = parse_tags(tags)
 
-    if not rag_exists(RAG_id) or not check_rag_owner(user_id, RAG_id):
-        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+    #check token credentials and load metadata
+    rag_info = get_owned_rag(principal, RAG_id)
     
-    #load metadata
-    rag_info = get_rag_json(RAG_id)
-
     #save uploaded files to disk
     rag_dir = os.path.join(BASE_DIR, user_id, RAG_id)
     os.makedirs(rag_dir, exist_ok=True)
@@ -291,41 +512,123 @@ async def add_documents_to_rag(
     
     #Convert, Chunk, Embed, Save to Chroma
     collection_name = f"{user_id}_{RAG_id}"
+    uploaded_at = int(time.time())
 
-    for file_path in new_saved_files:
-        prep = PrepareFile(file_path)
-        docs = prep.load_documents()
-        chunks = prep.doc_splitter(docs)
-        chunks = prep.id_chunks(chunks)
-
-        #save id chunks to chroma db
-        prep.save_to_chromadb(chunks, collection_name=collection_name, persist_directory=CHROMA_DIR)
+    set_usage_scope(user_id, RAG_id)
+    pipeline = IngestionPipeline(collection_name, uploaded_at, upload_tags)
+    ingestion_report = await run_in_threadpool(pipeline.run, new_saved_files)
 
 
     #Update RAG DB with new documents and metadata
-    with SessionLocal() as session:
-        rag_row = session.query(Rag_Table).filter(Rag_Table.rag_id == RAG_id).first()
-
-        if rag_row.documents:
-            existing_docs = json.loads(rag_row.documents)
-        else:
-            existing_docs = []
-        updated_docs = list(set(existing_docs + new_saved_files))
-
-        rag_row.documents = json.dumps(updated_docs)
-        session.commit()
+    total_documents = add_rag_documents(RAG_id, new_saved_files)
 
     return {
         "message": "Documents added successfully",
         "new_documents": new_saved_files,
-        "total_documents": len(updated_docs)
+        "total_documents": total_documents,
+        "ingestion": ingestion_report,
     } 
 
 
+def _exportable_config(user_id: str, RAG_id: str, rag_info: dict):
+    config_path = os.path.join(BASE_DIR, user_id, RAG_id, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+    else:
+        config = {
+            "RAG_name": rag_info["RAG_name"],
+            "Model": rag_info["Model"],
+            "documents": json.loads(rag_info["documents"] or "[]"),
+        }
+
+    # Snapshots travel between users/environments: no owner, no local paths
+    config.pop("user_id", None)
+    config.pop("key", None)
+    config["documents"] = [os.path.basename(d) for d in config.get("documents", [])]
+    return config
+
+
+def export_rag(
+    RAG_id: str,
+    principal: Principal = Depends(get_current_principal),
+):
+    user_id = principal.user_id
+
+    rag_info = get_owned_rag(principal, RAG_id)
+
+    config = _exportable_config(user_id, RAG_id, rag_info)
+    collection = get_rag_collection(f"{user_id}_{RAG_id}")
+
+    return StreamingResponse(
+        iter_snapshot(collection, config, EMBEDDING_MODEL_ID),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="rag_{RAG_id}.tar.gz"'},
+    )
+
+
+async def import_rag(
+    snapshot: UploadFile = File(...),
+    key: str = Form(...),
+    RAG_name: str = Form(None),
+    Model: str = Form(None),
+    principal: Principal = Depends(get_current_principal),
+):
+    user_id = principal.user_id
+
+    try:
+        tar, manifest = await run_in_threadpool(read_manifest, snapshot.file)
+    except (SnapshotError, tarfile.TarError, zlib.error, EOFError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+
+    if manifest.get("embedding_model") != EMBEDDING_MODEL_ID:
+        raise HTTPException(status_code=400, detail="Snapshot was built with a different embedding model")
+
+    config = manifest.get("config", {})
+    rag_name = RAG_name or config.get("RAG_name")
+    model_name = Model or config.get("Model")
+    if not rag_name or not model_name:
+        raise HTTPException(status_code=400, detail="RAG_name and Model are required")
+
+    rag_id = str(uuid.uuid4())
+    # The RAG dir exists before the collection so storage GC sees the import as in progress
+    rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
+    os.makedirs(rag_dir, exist_ok=True)
+
+    collection_name = f"{user_id}_{rag_id}"
+
+    # Vectors are loaded as-is: no embedding calls
+    try:
+        with residency_manager.writing():
+            collection = get_chroma_client().get_or_create_collection(
+                name=collection_name,
+                metadata=manifest.get("collection_metadata") or {"hnsw:space": "cosine"},
+            )
+            loaded, dim = await run_in_threadpool(load_snapshot_batches, tar, collection, rag_dir)
+    except (SnapshotError, tarfile.TarError, zlib.error, EOFError, ValueError) as e:
+        drop_collection(collection_name)
+        shutil.rmtree(rag_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+
+    residency_manager.record_size(collection_name, loaded, dim)
+
+    # Imported vectors count as stored chunks but cost no embedding calls
+    usage_ledger.record(user_id, rag_id, chunks_ingested=loaded)
+
+    documents = config.get("documents", [])
+    insert_rag(rag_id, user_id, rag_name, model_name, encrypt_key(key), json.dumps(documents))
+    invalidate_user(user_id)
+
+    with open(os.path.join(rag_dir, "config.json"), "w") as f:
+        json.dump({**config, "user_id": user_id, "RAG_name": rag_name, "Model": model_name}, f, indent=2)
+
+    return {"RAG_id": rag_id, "chromadb": collection_name, "chunks_loaded": loaded}
+
+
 def get_all_rag(
-    current_user_id: str = Depends(get_current_user_token)
+    principal: Principal = Depends(get_current_principal)
     ):
-    user_id = current_user_id
+    user_id = principal.user_id
 
     with SessionLocal() as session:
         rags = session.query(Rag_Table).filter(Rag_Table.user_id == user_id).all()
@@ -337,17 +640,48 @@ def get_all_rag(
 
 
 def delete_rag(rag_id: str,
-                current_user_id: str = Depends(get_current_user_token)
+                background_tasks: BackgroundTasks,
+                principal: Principal = Depends(get_current_principal)
             ):
-    user_id = current_user_id
+    user_id = principal.user_id
 
-    if not check_rag_owner(user_id, rag_id):
+    if not principal.owns(rag_id):
         raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
-    
-    db_deleted, files_deleted, chroma_deleted = delete_rag_by_id(user_id, rag_id)
 
-    if not db_deleted and not files_deleted and not chroma_deleted:
+    # Large RAGs are removed from disk after the response is sent
+    background = rag_storage_bytes(user_id, rag_id) > BACKGROUND_DELETE_BYTES
+
+    db_deleted, files_deleted, chroma_deleted = delete_rag_by_id(user_id, rag_id, purge=not background)
+    invalidate_user(user_id)
+
+    if not db_deleted:
         raise HTTPException(status_code=404, detail="RAG not found")
 
-    return 
-      
\ No newline at end of file
+    if background:
+        background_tasks.add_task(purge_rag_storage, user_id, rag_id)
+
+    return
+
+
+def delete_all_rags(background_tasks: BackgroundTasks,
+                principal: Principal = Depends(get_current_principal)
+            ):
+    user_id = principal.user_id
+
+    rag_ids = delete_rags_for_user(user_id)
+    invalidate_user(user_id)
+
+    for rag_id in rag_ids:
+        background_tasks.add_task(purge_rag_storage, user_id, rag_id)
+
+    return {"deleted_rags": rag_ids, "total_deleted": len(rag_ids)}
+
+
+def run_storage_gc(dry_run: bool = False, compact: bool = False):
+    report = run_gc(dry_run=dry_run, compact=compact)
+    print(f"GC reclaimed {report['bytes_reclaimed']} bytes (dry_run={dry_run})")
+    return report
+
+
+def get_residency_metrics():
+    return residency_manager.metrics()
@@ -1,12 +1,35 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 
 # Pydantic for RAG_ID 
 class CreateRAGResponse(BaseModel):
     RAG_id: str
+    ingestion: Optional[dict] = None
+
+
+# Metadata pre-filters pushed down into the vector search
+class QueryFilters(BaseModel):
+    source: Optional[list[str]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    tags: Optional[dict[str, str]] = None
 
 
 class RAGQueryRequest(BaseModel):
     query: str
+    filters: Optional[QueryFilters] = None
+    # Adaptive retrieval overrides (defaults come from the environment)
+    k_min: Optional[int] = None
+    k_max: Optional[int] = None
+    score_threshold: Optional[float] = None
+
+
+class PrewarmRequest(BaseModel):
+    queries: list[str]
 
 
 class RagListItem(BaseModel):
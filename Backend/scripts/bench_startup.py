@@ -0,0 +1,100 @@
+"""
+Startup benchmark based on `python -X importtime`.
+
+Imports the API module in a fresh interpreter, parses the import-time report
+and fails when the total import time or any forbidden (lazy) module regresses.
+
+Usage (from the Backend directory):
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --module main --budget-ms 1500 --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Provider SDKs and loaders that must only be imported on first use.
+LAZY_MODULES = [
+    "langchain_aws",
+    "langchain_openai",
+    "langchain_chroma",
+    "langchain_community",
+    "chromadb",
+    "PyPDF2",
+    "pypdf",
+    "numpy",
+]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_importtime(module: str):
+    """Import `module` in a new interpreter and return the parsed importtime rows."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def top_level_total(rows):
+    """Sum the cumulative time of top-level imports (no indentation)."""
+    return sum(cum for name, _, cum in rows if not name.startswith("  "))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import time")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "2000")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    rows = []
+    for _ in range(args.runs):
+        rows = run_importtime(args.module)
+        totals.append(top_level_total(rows) / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms)")
+
+    print(f"\nTop {args.top} modules by cumulative time (last run):")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cum_us / 1000:9.1f} ms  {name.strip()}")
+
+    failures = []
+    imported = {name.strip().split(".")[0] for name, _, _ in rows}
+    eager = [m for m in LAZY_MODULES if m in imported]
+    if eager:
+        failures.append(f"modules imported eagerly at startup: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+    if failures:
+        print("\nFAIL")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
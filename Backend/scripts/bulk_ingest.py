@@ -0,0 +1,364 @@
+"""
+Offline bulk ingestion: create or extend a RAG from a local directory or
+manifest without going through the HTTP upload endpoints.
+
+Files are copied into rag_data/<user>/<rag>/ and recorded in rag_table exactly
+like /rag/create and /rag/add_docs. Parsing runs in a process pool (one process
+per core by default), embedding and writing go through the IngestionPipeline.
+Every file whose chunks are fully written is appended to a checkpoint, so
+re-running the same command after an interruption (or with failed files fixed)
+skips finished files.
+
+Usage (from the Backend directory):
+    python -m scripts.bulk_ingest --user-id <user> --dir /data/manuals \\
+        --name "Manuals" --model claude --key <api-key>
+    python -m scripts.bulk_ingest --user-id <user> --rag-id <rag> --manifest files.txt
+
+Stop the API server first. Chroma does not support two processes writing the
+same chroma_data store, and a running server keeps serving the index it has
+already loaded, so it would not see the new vectors until restarted.
+
+The default checkpoint is keyed by user, --rag-id and source, so ingesting the
+same directory into a second new RAG needs an explicit --checkpoint.
+
+A manifest lists one file path per line (relative paths are resolved against
+the manifest's directory; blank lines and lines starting with # are ignored).
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+from db.crud import BASE_DIR, user_id_exists, check_rag_owner, insert_rag, add_rag_documents
+from db.database import Base, engine
+from usage.ledger import usage_scope, usage_ledger
+from utils.ingest import IngestionPipeline, parse_file, INGEST_EMBED_WORKERS
+from utils.metadata_filters import parse_tags
+
+CHECKPOINT_DIR = "./ingest_checkpoints"
+
+
+def discover_files(directory: str | None, manifest: str | None, pattern: str) -> list[str]:
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+    else:
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files) if fnmatch.fnmatch(name.lower(), pattern))
+
+    # Uploads are stored flat and chunk ids are derived from the file name, so
+    # two files with the same name would overwrite each other
+    files = {}
+    for path in map(os.path.abspath, paths):
+        name = os.path.basename(path)
+        if name in files:
+            if files[name] != path:
+                print(f"Skipping {path}: a file named {name} is already part of this run")
+            continue
+        files[name] = path
+    return list(files.values())
+
+
+def tags_arg(raw: str) -> dict:
+    try:
+        return parse_tags(raw)
+    except HTTPException as e:
+        raise argparse.ArgumentTypeError(e.detail)
+
+
+def default_checkpoint(user_id: str, rag_id: str | None, source: str) -> str:
+    digest = hashlib.sha1(f"{user_id}:{rag_id}:{os.path.abspath(source)}".encode()).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, f"{digest}.jsonl")
+
+
+class Checkpoint:
+    """Append-only JSONL: a header with the target RAG, then one line per finished file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = None
+        self.done: dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted write
+                    if "rag_id" in record:
+                        self.header = record
+                    else:
+                        self.done[record["file"]] = record["chunks"]
+        self._lock = threading.Lock()
+        self._file = None
+
+    def open(self, header: dict | None = None):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "a")
+        if self.header is None:
+            self.header = header
+            self._append(header)
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def mark_done(self, file_path: str, chunks: int):
+        with self._lock:
+            self.done[file_path] = chunks
+            self._append({"file": file_path, "chunks": chunks})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class Progress:
+    def __init__(self, total_files: int, report_seconds: float):
+        self.total_files = total_files
+        self.report_seconds = report_seconds
+        self.files = 0
+        self.chunks = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+        self._lock = threading.Lock()
+
+    def add(self, chunks: int):
+        with self._lock:
+            self.files += 1
+            self.chunks += chunks
+            now = time.perf_counter()
+            if now - self._last_report >= self.report_seconds:
+                self._last_report = now
+                print(self.line())
+
+    def rates(self):
+        elapsed = time.perf_counter() - self.start
+        files_per_s = self.files / elapsed if elapsed else 0.0
+        chunks_per_s = self.chunks / elapsed if elapsed else 0.0
+        remaining = self.total_files - self.files
+        eta = remaining / files_per_s if files_per_s else None
+        return elapsed, files_per_s, chunks_per_s, eta
+
+    def line(self) -> str:
+        elapsed, files_per_s, chunks_per_s, eta = self.rates()
+        percent = 100 * self.files / self.total_files if self.total_files else 100.0
+        return (f"{self.files}/{self.total_files} files ({percent:.1f}%), {self.chunks} chunks | "
+                f"{files_per_s:.2f} files/s, {chunks_per_s:.1f} chunks/s | "
+                f"elapsed {_format_duration(elapsed)}, ETA {_format_duration(eta) if eta is not None else '?'}")
+
+
+def create_target_rag(args, user_id: str) -> str:
+    from config.security import encrypt_key
+
+    if not (args.name and args.model and args.key):
+        sys.exit("--name, --model and --key are required when creating a new RAG")
+
+    rag_id = str(uuid.uuid4())
+    rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
+    os.makedirs(rag_dir, exist_ok=True)
+
+    insert_rag(rag_id, user_id, args.name, args.model, encrypt_key(args.key), json.dumps([]))
+    with open(os.path.join(rag_dir, "config.json"), "w") as f:
+        json.dump({
+            "user_id": user_id,
+            "RAG_name": args.name,
+            "Model": args.model,
+            "documents": [],
+            "tags": args.tags,
+        }, f, indent=2)
+    print(f"Created RAG {rag_id} ({args.name}) for user {user_id}")
+    return rag_id
+
+
+def update_config_documents(rag_dir: str, documents: list[str]):
+    config_path = os.path.join(rag_dir, "config.json")
+    if not os.path.exists(config_path):
+        return
+    with open(config_path) as f:
+        config = json.load(f)
+    config["documents"] = sorted(set(config.get("documents", [])) | set(documents))
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest local files into a RAG")
+    parser.add_argument("--user-id", required=True, help="Owner of the RAG")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Directory to ingest (searched recursively)")
+    source.add_argument("--manifest", help="File listing the paths to ingest, one per line")
+    parser.add_argument("--pattern", default="*.pdf", help="File name pattern used with --dir (default: *.pdf)")
+    parser.add_argument("--rag-id", help="Extend this RAG instead of creating a new one")
+    parser.add_argument("--name", help="RAG name (new RAG)")
+    parser.add_argument("--model", help="Model (new RAG)")
+    parser.add_argument("--key", help="Model API key, stored encrypted (new RAG)")
+    parser.add_argument("--tags", type=tags_arg, default={}, help='Tags applied to every chunk, as a JSON object')
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    parser.add_argument("--embed-workers", type=int, default=INGEST_EMBED_WORKERS, help="Concurrent embedding requests")
+    parser.add_argument("--batch-files", type=int, default=500,
+                        help="Files per pipeline run; rag_table is updated after each one")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: derived from user, RAG and source)")
+    parser.add_argument("--report-seconds", type=float, default=10, help="Progress report interval")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+
+    print("Make sure the API server is stopped: it cannot share chroma_data with this process.")
+
+    user_id = args.user_id
+    if not user_id_exists(user_id):
+        sys.exit(f"User {user_id} does not exist")
+
+    source_path = args.dir or args.manifest
+    checkpoint = Checkpoint(args.checkpoint or default_checkpoint(user_id, args.rag_id, source_path))
+
+    # A checkpoint from an interrupted run pins the RAG it was writing to
+    if checkpoint.header is not None:
+        rag_id = checkpoint.header["rag_id"]
+        if args.rag_id and args.rag_id != rag_id:
+            sys.exit(f"Checkpoint {checkpoint.path} belongs to RAG {rag_id}, not {args.rag_id}")
+        uploaded_at = checkpoint.header["uploaded_at"]
+        print(f"Resuming into RAG {rag_id} from {checkpoint.path} ({len(checkpoint.done)} files already done)")
+    else:
+        rag_id = args.rag_id
+        uploaded_at = int(time.time())
+        if rag_id is None:
+            rag_id = create_target_rag(args, user_id)
+
+    if not check_rag_owner(user_id, rag_id):
+        sys.exit(f"RAG {rag_id} not found or does not belong to user {user_id}")
+
+    checkpoint.open({"user_id": user_id, "rag_id": rag_id, "source": os.path.abspath(source_path),
+                     "uploaded_at": uploaded_at})
+
+    rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
+    os.makedirs(rag_dir, exist_ok=True)
+    collection_name = f"{user_id}_{rag_id}"
+
+    def stored_path(file_path: str) -> str:
+        return os.path.join(rag_dir, os.path.basename(file_path))
+
+    # Files finished by an interrupted run may not have reached rag_table yet
+    if checkpoint.done:
+        finished = [stored_path(path) for path in checkpoint.done]
+        add_rag_documents(rag_id, finished)
+        update_config_documents(rag_dir, finished)
+
+    files = discover_files(args.dir, args.manifest, args.pattern)
+    pending = [path for path in files if path not in checkpoint.done]
+    print(f"{len(files)} files found, {len(files) - len(pending)} already ingested, {len(pending)} to go")
+    if not pending:
+        checkpoint.close()
+        return
+
+    progress = Progress(len(pending), args.report_seconds)
+    chunk_counts = {}
+    failed = {}
+    # Spawned workers do not inherit the Chroma client or the pipeline threads
+    executor = ProcessPoolExecutor(max_workers=max(1, args.workers),
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    def parse_in_process(file_path: str):
+        # Parse the stored copy so chunk metadata points at rag_data, as with uploads
+        dest = stored_path(file_path)
+        try:
+            shutil.copy2(file_path, dest)
+            chunks = executor.submit(parse_file, dest, uploaded_at, args.tags).result()
+        except Exception as e:
+            # One unreadable file should not stop a 20k file run; it is left
+            # out of the checkpoint so the next run retries it
+            print(f"Error parsing {file_path}: {e}")
+            failed[file_path] = str(e)
+            if os.path.exists(dest):
+                os.remove(dest)
+            return []
+        chunk_counts[file_path] = len(chunks)
+        return chunks
+
+    def on_file_written(file_path: str):
+        if file_path in failed:
+            return
+        chunks = chunk_counts.pop(file_path, 0)
+        checkpoint.mark_done(file_path, chunks)
+        progress.add(chunks)
+
+    reports = []
+    try:
+        with usage_scope(user_id, rag_id):
+            for i in range(0, len(pending), args.batch_files):
+                group = pending[i:i + args.batch_files]
+                pipeline = IngestionPipeline(
+                    collection_name,
+                    uploaded_at,
+                    args.tags,
+                    parse_workers=args.workers,
+                    embed_workers=args.embed_workers,
+                    parse_fn=parse_in_process,
+                    on_file_written=on_file_written,
+                )
+                reports.append(pipeline.run(group))
+
+                stored = [stored_path(path) for path in group if path not in failed]
+                total_documents = add_rag_documents(rag_id, stored)
+                update_config_documents(rag_dir, stored)
+                print(progress.line())
+                print(f"RAG {rag_id} now has {total_documents} documents "
+                      f"(bottleneck: {reports[-1]['bottleneck']})")
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. {progress.line()}")
+        print("Re-run the same command to resume from the checkpoint.")
+        sys.exit(130)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+        usage_ledger.flush()
+
+    elapsed, files_per_s, chunks_per_s, _ = progress.rates()
+    stage_busy = {}
+    for report in reports:
+        for name, stage in report["stages"].items():
+            stage_busy[name] = stage_busy.get(name, 0) + stage["busy_s"] / stage["workers"]
+
+    print(json.dumps({
+        "rag_id": rag_id,
+        "files": progress.files,
+        "chunks": progress.chunks,
+        "skipped_already_done": len(files) - len(pending),
+        "failed": failed,
+        "wall_s": round(elapsed, 1),
+        "files_per_s": round(files_per_s, 2),
+        "chunks_per_s": round(chunks_per_s, 1),
+        "parse_workers": args.workers,
+        "embed_workers": args.embed_workers,
+        # Busy time per worker: the largest stage is the one to scale up
+        "stage_busy_s_per_worker": {name: round(busy, 1) for name, busy in stage_busy.items()},
+        "bottleneck": max(stage_busy, key=stage_busy.get) if stage_busy else None,
+        "checkpoint": checkpoint.path,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Reconcile rag_table, rag_data/ and Chroma collections and reclaim orphans.
+
+Usage (from the Backend directory):
+    python -m scripts.gc_storage --dry-run
+    python -m scripts.gc_storage --compact
+"""
+import argparse
+import json
+
+from utils.storage_gc import run_gc, GC_MIN_AGE_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect orphaned RAG storage")
+    parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting")
+    parser.add_argument("--compact", action="store_true", help="VACUUM the Chroma sqlite file afterwards")
+    parser.add_argument("--min-age", type=int, default=GC_MIN_AGE_SECONDS,
+                        help="Skip storage modified within this many seconds (in-flight uploads)")
+    args = parser.parse_args()
+
+    report = run_gc(dry_run=args.dry_run, compact=args.compact, min_age=args.min_age)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Load generator for capacity planning.
+
+Drives /rag/{id}/query and/or /rag/create at a target request rate and reports
+throughput, tail latency, event-loop lag and memory. By default the FastAPI app
+runs in-process with the simulation providers (fake embeddings + fake LLM), so
+no Bedrock/OpenAI calls are made and results are reproducible.
+
+Usage (from the Backend directory):
+    python -m scripts.load_test --scenario query --rps 50 --duration 30
+    python -m scripts.load_test --scenario mixed --rps 20 --llm-latency-ms 800
+    python -m scripts.load_test --base-url http://localhost:8000 --rps 10
+
+Use --fail-p99-ms / --min-throughput to turn a run into a regression gate.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+WORDS = (
+    "pump valve pressure manual warranty install filter motor voltage sensor "
+    "calibration maintenance schedule replacement torque gasket bearing seal "
+    "temperature alarm reset firmware safety inspection coolant flow"
+).split()
+
+OUT_OF_SCOPE = [
+    "what is the capital of france",
+    "who won the football match yesterday",
+    "recommend a good pasta recipe",
+]
+
+
+def make_pdf(text_lines: list[str]) -> bytes:
+    """Build a minimal single-page PDF with the given lines of text."""
+    content = ["BT", "/F1 11 Tf", "50 780 Td", "14 TL"]
+    for line in text_lines:
+        escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content.append(f"({escaped}) '")
+    content.append("ET")
+    stream = "\n".join(content).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_at = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def sample_document(rng: random.Random, lines: int = 50) -> bytes:
+    return make_pdf([" ".join(rng.choices(WORDS, k=10)) for _ in range(lines)])
+
+
+def sample_query(rng: random.Random, out_of_scope_ratio: float) -> str:
+    if rng.random() < out_of_scope_ratio:
+        return rng.choice(OUT_OF_SCOPE)
+    return "how do I " + " ".join(rng.choices(WORDS, k=4))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (Linux), 0 if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires; lag means the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected) * 1000)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def setup_tenant(client: httpx.AsyncClient, rng: random.Random, model: str) -> tuple[dict, str]:
+    username = f"loadtest-{uuid.uuid4().hex[:8]}"
+    password = uuid.uuid4().hex
+
+    r = await client.post("/auth/create_user", json={"username": username, "password": password})
+    r.raise_for_status()
+    r = await client.post("/auth/login", json={"username": username, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    r = await client.post(
+        "/rag/create",
+        headers=headers,
+        data={"RAG_name": "load-test", "Model": model, "key": "unused"},
+        files=[("documents", ("manual.pdf", sample_document(rng), "application/pdf"))],
+    )
+    r.raise_for_status()
+    return headers, r.json()["RAG_id"]
+
+
+async def run_load(client: httpx.AsyncClient, args, headers: dict, rag_id: str, rng: random.Random):
+    results = []  # (kind, status, latency_s)
+    in_flight = asyncio.Semaphore(args.max_in_flight)
+    document = sample_document(rng)
+
+    async def one(kind: str):
+        async with in_flight:
+            start = time.perf_counter()
+            try:
+                if kind == "query":
+                    r = await client.post(
+                        f"/rag/{rag_id}/query",
+                        headers=headers,
+                        json={"query": sample_query(rng, args.out_of_scope_ratio)},
+                    )
+                else:
+                    r = await client.post(
+                        "/rag/create",
+                        headers=headers,
+                        data={"RAG_name": "load-test", "Model": args.model, "key": "unused"},
+                        files=[("documents", ("manual.pdf", document, "application/pdf"))],
+                    )
+                status = r.status_code
+            except httpx.HTTPError:
+                status = 0
+            results.append((kind, status, time.perf_counter() - start))
+
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    tasks = []
+    # Open-loop schedule: requests are sent on time even if earlier ones are slow
+    for i in range(total):
+        delay = start + i / args.rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if args.scenario == "mixed":
+            kind = "create" if rng.random() < args.create_ratio else "query"
+        else:
+            kind = args.scenario
+        tasks.append(asyncio.create_task(one(kind)))
+
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed: float, lag_samples: list[float], rss_start: float, rss_peak: float, args):
+    report = {
+        "scenario": args.scenario,
+        "target_rps": args.rps,
+        "duration_s": round(elapsed, 2),
+        "requests": len(results),
+        "throughput_rps": round(sum(1 for _, s, _ in results if 200 <= s < 300) / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(1 for _, s, _ in results if not 200 <= s < 300),
+        "latency_ms": {},
+        "event_loop_lag_ms": None,
+        "memory_mb": {"rss_start": round(rss_start, 1), "rss_peak": round(rss_peak, 1), "rss_end": round(rss_mb(), 1)},
+    }
+
+    for kind in sorted({k for k, _, _ in results}):
+        latencies = [lat * 1000 for k, _, lat in results if k == kind]
+        report["latency_ms"][kind] = {
+            "count": len(latencies),
+            "p50": round(percentile(latencies, 50), 1),
+            "p90": round(percentile(latencies, 90), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1),
+            "mean": round(statistics.fmean(latencies), 1),
+        }
+
+    if lag_samples:
+        report["event_loop_lag_ms"] = {
+            "p50": round(percentile(lag_samples, 50), 2),
+            "p99": round(percentile(lag_samples, 99), 2),
+            "max": round(max(lag_samples), 2),
+        }
+    return report
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    lag = None
+
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+        lifespan = None
+    else:
+        # In-process: the app shares this event loop, so loop lag reflects the app
+        from main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        lag = LoopLagMonitor()
+
+    rss_start = rss_mb()
+    rss_peak = rss_start
+
+    async def sample_memory():
+        nonlocal rss_peak
+        while True:
+            rss_peak = max(rss_peak, rss_mb())
+            await asyncio.sleep(0.5)
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+            headers, rag_id = await setup_tenant(client, rng, args.model)
+
+            memory_task = asyncio.create_task(sample_memory())
+            if lag:
+                lag.start()
+            results, elapsed = await run_load(client, args, headers, rag_id, rng)
+            if lag:
+                await lag.stop()
+            memory_task.cancel()
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return summarize(results, elapsed, lag.samples if lag else [], rss_start, rss_peak, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG API")
+    parser.add_argument("--scenario", choices=["query", "create", "mixed"], default="query")
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--create-ratio", type=float, default=0.1, help="Share of /rag/create in mixed runs")
+    parser.add_argument("--out-of-scope-ratio", type=float, default=0.2)
+    parser.add_argument("--model", default="simulation", help="Model for the load-test RAG")
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--llm-latency-ms", type=float, help="Simulated LLM first-token latency")
+    parser.add_argument("--llm-tokens-per-second", type=float, help="Simulated LLM streaming rate")
+    parser.add_argument("--embed-latency-ms", type=float, help="Simulated embedding call latency")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    parser.add_argument("--fail-p99-ms", type=float, help="Exit non-zero if any p99 latency exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Exit non-zero if throughput is below this")
+    args = parser.parse_args()
+
+    if not args.base_url:
+        # Simulation providers must be configured before the app is imported.
+        # Data goes to a throwaway directory so the real database is untouched.
+        os.environ.setdefault("EMBEDDINGS_PROVIDER", "simulation")
+        os.environ.setdefault("LLM_PROVIDER", "simulation")
+        if args.llm_latency_ms is not None:
+            os.environ["SIM_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+        if args.llm_tokens_per_second is not None:
+            os.environ["SIM_LLM_TOKENS_PER_SECOND"] = str(args.llm_tokens_per_second)
+        if args.embed_latency_ms is not None:
+            os.environ["SIM_EMBED_LATENCY_MS"] = str(args.embed_latency_ms)
+        sys.path.insert(0, os.getcwd())
+        os.chdir(tempfile.mkdtemp(prefix="rag-loadtest-"))
+
+    report = asyncio.run(main_async(args))
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(json.dumps(report, indent=2))
+
+    failures = []
+    if args.fail_p99_ms is not None:
+        for kind, stats in report["latency_ms"].items():
+            if stats["p99"] > args.fail_p99_ms:
+                failures.append(f"{kind} p99 {stats['p99']} ms > {args.fail_p99_ms} ms")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']} rps < {args.min_throughput} rps")
+    if failures:
+        print("FAIL: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from db.crud import add_usage, USAGE_COUNTERS
+
+# Per-tenant usage ledger. Counters are aggregated in memory per
+# (user_id, rag_id, day) and flushed to usage_table in one batched upsert,
+# either every USAGE_FLUSH_SECONDS or once USAGE_FLUSH_EVENTS records pile up,
+# so recording on the request path is a dict update under a lock.
+
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "10"))
+USAGE_FLUSH_EVENTS = int(os.getenv("USAGE_FLUSH_EVENTS", "1000"))
+
+# (user_id, rag_id) of the request being served; lets shared code such as the
+# embeddings wrapper attribute usage without threading ids through every call.
+_usage_scope: ContextVar[tuple[str, str] | None] = ContextVar("usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(user_id: str, rag_id: str):
+    token = _usage_scope.set((user_id, rag_id))
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def set_usage_scope(user_id: str, rag_id: str):
+    """Attribute usage for the rest of the current request (each request has its own context)."""
+    _usage_scope.set((user_id, rag_id))
+
+
+def _period() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class UsageLedger:
+    def __init__(self, flush_seconds: float = USAGE_FLUSH_SECONDS, flush_events: int = USAGE_FLUSH_EVENTS):
+        self.flush_seconds = flush_seconds
+        self.flush_events = flush_events
+        self._pending: dict[tuple[str, str, str], dict[str, int]] = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, user_id: str, rag_id: str, **counts: int):
+        key = (user_id, rag_id, _period())
+        with self._lock:
+            bucket = self._pending.setdefault(key, dict.fromkeys(USAGE_COUNTERS, 0))
+            for name, value in counts.items():
+                bucket[name] += value
+            self._events += 1
+            if self._events >= self.flush_events:
+                self._wake.set()
+
+    def flush(self):
+        """Write pending counters to the database. Safe to call from any thread."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._events = 0
+            if not pending:
+                return 0
+            rows = [
+                {"user_id": user_id, "rag_id": rag_id, "period": period, **counters}
+                for (user_id, rag_id, period), counters in pending.items()
+            ]
+            try:
+                add_usage(rows)
+            except Exception as e:
+                # Put the counts back so they go out with the next flush
+                print(f"Usage flush failed, retrying later: {e}")
+                with self._lock:
+                    for key, counters in pending.items():
+                        bucket = self._pending.setdefault(key, dict.fromkeys(USAGE_COUNTERS, 0))
+                        for name, value in counters.items():
+                            bucket[name] += value
+                return 0
+            return len(rows)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+usage_ledger = UsageLedger()
+
+
+def record_usage(**counts: int):
+    """Record counters against the current usage scope (no-op outside a scope)."""
+    scope = _usage_scope.get()
+    if scope is not None:
+        usage_ledger.record(scope[0], scope[1], **counts)
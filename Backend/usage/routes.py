@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from datetime import date
+
+from config.security import *
+
+from usage.service import *
+
+
+router = APIRouter(prefix="/usage", tags=["Usage"])
+
+@router.get("")
+def get_usage_route(
+    since: date | None = None,
+    principal: Principal = Depends(get_current_principal),
+):
+    return_val = get_usage(since, principal)
+    return return_val
+
+@router.get("/{rag_id}")
+def get_rag_usage_route(
+    rag_id: str,
+    since: date | None = None,
+    principal: Principal = Depends(get_current_principal),
+):
+    return_val = get_rag_usage(rag_id, since, principal)
+    return return_val
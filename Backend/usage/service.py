@@ -0,0 +1,99 @@
+from fastapi import Depends, HTTPException
+from datetime import date
+
+from config.security import *
+from db.crud import get_usage_rows, USAGE_COUNTERS
+from usage.ledger import usage_ledger
+from utils.residency import residency_manager
+from utils.storage_gc import collection_name_for, rag_storage_bytes
+
+
+STORAGE_TOTALS = ("vectors", "uploaded_files_bytes", "vector_index_bytes_est", "cold_snapshot_bytes")
+
+
+def _rag_storage(user_id: str, rag_id: str):
+    # Reading usage must not load or restore a cold RAG
+    info = residency_manager.storage_info(collection_name_for(user_id, rag_id))
+    return {
+        "tier": info["tier"],
+        "vectors": info["vectors"],
+        # Original uploads under rag_data
+        "uploaded_files_bytes": rag_storage_bytes(user_id, rag_id),
+        # Vectors plus HNSW links in Chroma (vectors x (dim x 4 + link overhead))
+        "vector_index_bytes_est": info["index_bytes_est"],
+        # Compressed snapshot of a cold-tier RAG
+        "cold_snapshot_bytes": info["cold_bytes"],
+    }
+
+
+def _add_counters(total: dict, row):
+    for name in USAGE_COUNTERS:
+        total[name] += getattr(row, name)
+
+
+def get_usage(
+    since: date | None = None,
+    principal: Principal = Depends(get_current_principal),
+):
+    user_id = principal.user_id
+
+    # Make the in-memory counters visible before reading
+    usage_ledger.flush()
+    rows = get_usage_rows(user_id, since=since.isoformat() if since else None)
+
+    totals = dict.fromkeys(USAGE_COUNTERS, 0)
+    per_rag = {}
+    for row in rows:
+        _add_counters(totals, row)
+        _add_counters(per_rag.setdefault(row.rag_id, dict.fromkeys(USAGE_COUNTERS, 0)), row)
+
+    # Deleted RAGs keep their usage history but have no storage
+    rags = []
+    for rag_id in sorted(set(per_rag) | principal.rag_ids):
+        rags.append({
+            "rag_id": rag_id,
+            "usage": per_rag.get(rag_id, dict.fromkeys(USAGE_COUNTERS, 0)),
+            "storage": _rag_storage(user_id, rag_id) if principal.owns(rag_id) else None,
+        })
+
+    storage_totals = {
+        # Sizes of RAGs not accessed since sizes were recorded are unknown (None)
+        name: sum(r["storage"][name] or 0 for r in rags if r["storage"])
+        for name in STORAGE_TOTALS
+    }
+
+    return {
+        "user_id": user_id,
+        "since": since,
+        "totals": {**totals, **storage_totals},
+        "rags": rags,
+    }
+
+
+def get_rag_usage(
+    rag_id: str,
+    since: date | None = None,
+    principal: Principal = Depends(get_current_principal),
+):
+    user_id = principal.user_id
+
+    usage_ledger.flush()
+    rows = get_usage_rows(user_id, rag_id=rag_id, since=since.isoformat() if since else None)
+
+    if not rows and not principal.owns(rag_id):
+        raise HTTPException(status_code=404, detail="RAG not found or does not belong to user")
+
+    totals = dict.fromkeys(USAGE_COUNTERS, 0)
+    for row in rows:
+        _add_counters(totals, row)
+
+    return {
+        "rag_id": rag_id,
+        "since": since,
+        "totals": totals,
+        "daily": [
+            {"period": row.period, **{name: getattr(row, name) for name in USAGE_COUNTERS}}
+            for row in rows
+        ],
+        "storage": _rag_storage(user_id, rag_id) if principal.owns(rag_id) else None,
+    }
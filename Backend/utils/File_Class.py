@@ -1,13 +1,13 @@
-from dotenv import load_dotenv
+from __future__ import annotations
+
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_chroma import Chroma
+from typing import TYPE_CHECKING
 
-from utils.rag_utilities import get_embeddings, get_rag_collection, chroma_client, collection_cache
+from utils.metadata_filters import PAGE_KEY, UPLOADED_AT_KEY, TAG_PREFIX
+from utils.rag_utilities import get_embeddings, get_rag_collection, get_chroma_client, collection_cache
 
-load_dotenv()
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 class PrepareFile:
     def __init__(self, file):
@@ -15,11 +15,15 @@ class PrepareFile:
 
     def load_documents(self):
         """Load documents from a PDF file."""
+        from langchain_community.document_loaders import PyPDFLoader
+
         document_loader = PyPDFLoader(self.data_path)
         return document_loader.load()
 
     def doc_splitter(self, documents: list[Document]):
         """Split documents into chunks."""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=300,
             chunk_overlap=30,
@@ -37,6 +41,16 @@ class PrepareFile:
             chunk.metadata["id"] = chunk_id
         return chunks
 
+    def add_metadata(self, chunks, uploaded_at: int, tags: dict[str, str] | None = None):
+        """Attach filterable metadata (page, upload time, tags) to chunks."""
+        for chunk in chunks:
+            chunk.metadata.setdefault("source", self.data_path)
+            chunk.metadata[PAGE_KEY] = int(chunk.metadata.get("page", 0))
+            chunk.metadata[UPLOADED_AT_KEY] = uploaded_at
+            for key, value in (tags or {}).items():
+                chunk.metadata[f"{TAG_PREFIX}{key}"] = value
+        return chunks
+
     # def save_to_chromadb(self, chunks, collection_name: str, persist_directory: str = "./chroma_data"):
     #     """
     #     Save chunks to ChromaDB using cached embeddings and cached collection.
@@ -70,6 +84,8 @@ class PrepareFile:
             Saves a list of document chunks to a ChromaDB collection using the client.
             The Chroma.from_documents method correctly handles collection creation.
             """
+            from langchain_chroma import Chroma
+
             embeddings = get_embeddings()
             
             # Chroma.from_documents ensures the collection exists (or creates it) and adds the chunks.
@@ -78,7 +94,7 @@ class PrepareFile:
                 db = Chroma.from_documents(
                     documents=chunks,
                     embedding=embeddings,
-                    client=chroma_client,
+                    client=get_chroma_client(),
                     collection_name=collection_name,
                     persist_directory=persist_directory # Note: persist_directory is often ignored when client is provided, but included for completeness.
                 )
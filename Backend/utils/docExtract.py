@@ -1,5 +1,4 @@
 from io import BytesIO
-import PyPDF2
 from fastapi import UploadFile
 
 async def extract_text_from_file(file: UploadFile):
@@ -18,6 +17,8 @@ async def extract_text_from_file(file: UploadFile):
  
     if filename.endswith(".pdf"):
         try:
+            import PyPDF2
+
             pdf = PyPDF2.PdfReader(BytesIO(content))
             extracted = []
             for page in pdf.pages:
@@ -0,0 +1,137 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from usage.ledger import record_usage
+
+# Exact-match cache for query embeddings (normalized text -> vector).
+# Retrieval embeds the query text on every call; repeated questions hit the
+# cache instead of paying a Bedrock round trip. Keys include the embedding
+# model id, so every collection that uses the same model shares entries.
+
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "10000"))
+# Optional .npz file used to keep hot queries across restarts.
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different strings share an entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of (model_id, normalized query) -> embedding."""
+
+    def __init__(self, max_entries: int = QUERY_EMBED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_id: str, text: str):
+        key = (model_id, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_id: str, text: str, vector: list[float]):
+        with self._lock:
+            self._entries[(model_id, text)] = vector
+            self._entries.move_to_end((model_id, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def save(self, path: str):
+        """Write the cache to an .npz file, least recently used entries first."""
+        with self._lock:
+            items = list(self._entries.items())
+        if not items:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            model_ids=np.array([model_id for (model_id, _), _ in items]),
+            texts=np.array([text for (_, text), _ in items]),
+            vectors=np.array([vector for _, vector in items], dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+        print(f"Saved {len(items)} query embeddings to {path}")
+
+    def load(self, path: str):
+        if not os.path.exists(path):
+            return
+        data = np.load(path)
+        for model_id, text, vector in zip(data["model_ids"], data["texts"], data["vectors"]):
+            self.put(str(model_id), str(text), vector.tolist())
+        print(f"Loaded {len(data['texts'])} query embeddings from {path}")
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that serves embed_query from the shared query cache.
+
+    Document embeddings (ingestion) pass straight through to the wrapped model.
+    """
+
+    def __init__(self, inner: Embeddings, model_id: str, cache: QueryEmbeddingCache = query_embedding_cache):
+        self.inner = inner
+        self.model_id = model_id
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        record_usage(embedding_calls=len(texts))
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        normalized = normalize_query(text)
+        vector = self.cache.get(self.model_id, normalized)
+        if vector is None:
+            record_usage(embedding_calls=1)
+            vector = self.inner.embed_query(normalized)
+            self.cache.put(self.model_id, normalized, vector)
+        else:
+            record_usage(embedding_cache_hits=1)
+        return vector
+
+    def prewarm(self, queries: list[str]):
+        """Embed queries that are not cached yet. Returns (warmed, already_cached)."""
+        warmed = 0
+        already_cached = 0
+        for query in dict.fromkeys(normalize_query(q) for q in queries if q.strip()):
+            if (self.model_id, query) in self.cache:
+                already_cached += 1
+                continue
+            self.cache.put(self.model_id, query, self.inner.embed_query(query))
+            warmed += 1
+        record_usage(embedding_calls=warmed)
+        return warmed, already_cached
@@ -0,0 +1,272 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from usage.ledger import record_usage
+from utils.File_Class import PrepareFile
+from utils.rag_utilities import get_embeddings, get_rag_collection, get_chroma_client
+from utils.residency import residency_manager
+
+# Ingestion pipeline: parse/split -> embed -> write, connected by bounded queues
+# so parsing of the next file overlaps with embedding of the previous one.
+# All chunks go to the collection in large upserts sized to Chroma's max batch
+# instead of one Chroma.from_documents call per file.
+
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+DEFAULT_MAX_BATCH = 5000
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.busy_seconds += seconds
+
+    def report(self, wall_seconds: float):
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_s": round(self.busy_seconds, 3),
+            # Throughput per busy second of one worker, and over the whole run
+            "items_per_busy_s": round(self.items / self.busy_seconds, 1) if self.busy_seconds else None,
+            "items_per_wall_s": round(self.items / wall_seconds, 1) if wall_seconds else None,
+            "utilization": round(self.busy_seconds / (wall_seconds * self.workers), 2) if wall_seconds else None,
+        }
+
+
+def parse_file(file_path: str, uploaded_at: int, tags: dict | None = None):
+    """Load, split, id and tag one file. Returns its chunks."""
+    prep = PrepareFile(file_path)
+    docs = prep.load_documents()
+    chunks = prep.doc_splitter(docs)
+    chunks = prep.id_chunks(chunks)
+    return prep.add_metadata(chunks, uploaded_at, tags)
+
+
+def max_write_batch() -> int:
+    client = get_chroma_client()
+    getter = getattr(client, "get_max_batch_size", None)
+    return getter() if getter else getattr(client, "max_batch_size", DEFAULT_MAX_BATCH)
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        collection_name: str,
+        uploaded_at: int,
+        tags: dict | None = None,
+        parse_workers: int = INGEST_PARSE_WORKERS,
+        embed_workers: int = INGEST_EMBED_WORKERS,
+        embed_batch_size: int = INGEST_EMBED_BATCH,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        parse_fn=None,
+        on_file_written=None,
+    ):
+        self.collection_name = collection_name
+        self.uploaded_at = uploaded_at
+        self.tags = tags
+        self.parse_workers = max(1, parse_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.queue_size = queue_size
+        # parse_fn(file_path) -> chunks; defaults to parse_file in a thread
+        self.parse_fn = parse_fn or (lambda path: parse_file(path, uploaded_at, tags))
+        # Called with a file path once all of its chunks are in the collection
+        self.on_file_written = on_file_written
+
+        self.stats = {
+            "parse": StageStats("parse", self.parse_workers),
+            "embed": StageStats("embed", self.embed_workers),
+            "write": StageStats("write", 1),
+        }
+        self._errors = []
+        self._dim = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self._errors.append(error)
+        self._stop.set()
+
+    def _parse_worker(self, files: queue.Queue, parsed: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                file_path = files.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                start = time.perf_counter()
+                chunks = self.parse_fn(file_path)
+                with self._lock:
+                    self.stats["parse"].add(1, time.perf_counter() - start)
+                parsed.put((file_path, chunks))
+            except Exception as e:
+                print(f"Error parsing {file_path}: {e}")
+                self._fail(e)
+
+    def _embed_worker(self, parsed: queue.Queue, embedded: queue.Queue):
+        embeddings = get_embeddings()
+        while True:
+            item = parsed.get()
+            if item is _DONE:
+                return
+            if self._stop.is_set():
+                continue  # drain so producers never block
+            file_path, chunks = item
+            try:
+                for i in range(0, len(chunks), self.embed_batch_size):
+                    batch = chunks[i:i + self.embed_batch_size]
+                    start = time.perf_counter()
+                    vectors = embeddings.embed_documents([c.page_content for c in batch])
+                    with self._lock:
+                        self.stats["embed"].add(len(batch), time.perf_counter() - start)
+                    last = i + self.embed_batch_size >= len(chunks)
+                    embedded.put((file_path, last, batch, vectors))
+                if not chunks:
+                    embedded.put((file_path, True, [], []))
+            except Exception as e:
+                print(f"Error embedding {file_path}: {e}")
+                self._fail(e)
+
+    def _write(self, collection, ids, vectors, documents, metadatas):
+        start = time.perf_counter()
+        collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+        self._dim = len(vectors[0])
+        self.stats["write"].add(len(ids), time.perf_counter() - start)
+        record_usage(chunks_ingested=len(ids))
+
+    def run(self, file_paths: list[str]):
+        """Ingest files into the collection. Returns a per-stage throughput report."""
+        # The Chroma client must not be recycled under an open writer
+        with residency_manager.writing():
+            return self._run(file_paths)
+
+    def _run(self, file_paths: list[str]):
+        wall_start = time.perf_counter()
+        collection = get_rag_collection(self.collection_name)
+        write_batch = max_write_batch()
+
+        files = queue.Queue()
+        # Duplicate paths would produce duplicate chunk ids within one upsert
+        for path in dict.fromkeys(file_paths):
+            files.put(path)
+        parsed = queue.Queue(maxsize=self.queue_size)
+        embedded = queue.Queue(maxsize=self.queue_size)
+
+        # Workers run in a copy of the caller's context so usage is attributed to its RAG
+        parse_threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(self._parse_worker, files, parsed), daemon=True)
+            for _ in range(self.parse_workers)
+        ]
+        embed_threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(self._embed_worker, parsed, embedded), daemon=True)
+            for _ in range(self.embed_workers)
+        ]
+        for t in parse_threads + embed_threads:
+            t.start()
+
+        def close_stages():
+            for t in parse_threads:
+                t.join()
+            for _ in embed_threads:
+                parsed.put(_DONE)
+            for t in embed_threads:
+                t.join()
+            embedded.put(_DONE)
+
+        threading.Thread(target=close_stages, daemon=True).start()
+
+        # Writer runs on the calling thread and buffers up to Chroma's max batch
+        ids, vectors, documents, metadatas = [], [], [], []
+        owners = []         # file of each buffered chunk
+        buffered = {}       # file -> chunks still in the buffer
+        fully_embedded = set()
+        batches = 0
+
+        def flush(n):
+            self._write(collection, ids[:n], vectors[:n], documents[:n], metadatas[:n])
+            touched = set(owners[:n])
+            for path in owners[:n]:
+                buffered[path] -= 1
+            del ids[:n], vectors[:n], documents[:n], metadatas[:n], owners[:n]
+            # A file is done once all its chunks are embedded and none are still buffered
+            self._files_written([p for p in touched if p in fully_embedded and not buffered[p]])
+
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                break
+            if self._stop.is_set():
+                continue
+            file_path, last, batch, batch_vectors = item
+            for chunk, vector in zip(batch, batch_vectors):
+                # id_chunks ids are unique per file, so re-ingesting a file overwrites it
+                ids.append(chunk.metadata["id"])
+                vectors.append(vector)
+                documents.append(chunk.page_content)
+                metadatas.append(chunk.metadata)
+                owners.append(file_path)
+            buffered[file_path] = buffered.get(file_path, 0) + len(batch)
+            if last:
+                fully_embedded.add(file_path)
+                if not buffered[file_path]:
+                    self._files_written([file_path])  # no chunks, nothing to write
+
+            while len(ids) >= write_batch and not self._stop.is_set():
+                try:
+                    flush(write_batch)
+                except Exception as e:
+                    print(f"Error writing to collection {self.collection_name}: {e}")
+                    self._fail(e)
+                    break
+                batches += 1
+
+        if not self._errors and ids:
+            try:
+                flush(len(ids))
+                batches += 1
+            except Exception as e:
+                print(f"Error writing to collection {self.collection_name}: {e}")
+                self._fail(e)
+
+        if self._errors:
+            raise self._errors[0]
+
+        # Lets usage report the index size without opening the collection later
+        residency_manager.record_size(self.collection_name, collection.count(), self._dim)
+
+        wall = time.perf_counter() - wall_start
+        stages = {name: stage.report(wall) for name, stage in self.stats.items()}
+        # The stage with the highest utilization is the one holding the others back
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"] or 0)
+        report = {
+            "files": self.stats["parse"].items,
+            "chunks": self.stats["write"].items,
+            "write_batches": batches,
+            "max_write_batch": write_batch,
+            "wall_s": round(wall, 3),
+            "stages": stages,
+            "bottleneck": bottleneck,
+        }
+        print(f"Ingested {report['chunks']} chunks from {report['files']} files into "
+              f"{self.collection_name} in {report['wall_s']}s (bottleneck: {bottleneck})")
+        return report
+
+    def _files_written(self, file_paths):
+        if self.on_file_written:
+            for path in file_paths:
+                self.on_file_written(path)
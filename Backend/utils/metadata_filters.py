@@ -0,0 +1,76 @@
+import json
+import os
+import re
+
+from fastapi import HTTPException
+
+from db.crud import BASE_DIR
+
+# Chunk metadata used for pre-filtered search. Chroma keeps every metadata
+# key/value in indexed sqlite columns (typed by str/int/float), so filters on
+# these fields are resolved before the vector search. `source` and `page` are
+# written by the document loaders, so they are present on every collection,
+# including ones ingested before upload time and tags were recorded.
+SOURCE_KEY = "source"
+PAGE_KEY = "page"
+UPLOADED_AT_KEY = "uploaded_at"
+TAG_PREFIX = "tag_"
+
+_TAG_KEY = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+
+def parse_tags(raw_tags: str | None) -> dict[str, str]:
+    """Parse the `tags` form field (a JSON object of string values) sent at upload."""
+    if not raw_tags:
+        return {}
+    try:
+        tags = json.loads(raw_tags)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="tags must be a JSON object")
+
+    if not isinstance(tags, dict):
+        raise HTTPException(status_code=400, detail="tags must be a JSON object")
+
+    for key, value in tags.items():
+        if not _TAG_KEY.match(key) or not isinstance(value, (str, int, float, bool)):
+            raise HTTPException(status_code=400, detail=f"Invalid tag: {key}")
+
+    return {key: str(value) for key, value in tags.items()}
+
+
+def build_chroma_filter(filters, user_id: str, rag_id: str) -> dict | None:
+    """Translate a QueryFilters model into a Chroma `where` clause.
+
+    Uploads, imports and bulk ingest all store files as
+    rag_data/<user_id>/<rag_id>/<file name>, and the loaders record that path
+    as `source`, so a requested file name is matched against that path.
+    """
+    if filters is None:
+        return None
+
+    conditions = []
+
+    if filters.source:
+        paths = [os.path.join(BASE_DIR, user_id, rag_id, os.path.basename(s)) for s in filters.source]
+        conditions.append({SOURCE_KEY: {"$in": paths}})
+
+    if filters.page_min is not None:
+        conditions.append({PAGE_KEY: {"$gte": filters.page_min}})
+
+    if filters.page_max is not None:
+        conditions.append({PAGE_KEY: {"$lte": filters.page_max}})
+
+    if filters.uploaded_after is not None:
+        conditions.append({UPLOADED_AT_KEY: {"$gte": int(filters.uploaded_after.timestamp())}})
+
+    if filters.uploaded_before is not None:
+        conditions.append({UPLOADED_AT_KEY: {"$lte": int(filters.uploaded_before.timestamp())}})
+
+    for key, value in (filters.tags or {}).items():
+        conditions.append({f"{TAG_PREFIX}{key}": {"$eq": str(value)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
@@ -1,49 +1,247 @@
-from langchain_aws import BedrockEmbeddings
-from chromadb import PersistentClient
+import gc
+from collections import OrderedDict
 from functools import lru_cache
 import os
-from dotenv import load_dotenv
-from langchain_chroma import Chroma
+import threading
 
-load_dotenv()
+from config.env import load_env
 
-CHROMA_DIR = "./chroma_data" 
+load_env()
+
+CHROMA_DIR = "./chroma_data"
+
+# Provider SDKs (langchain_aws, chromadb, langchain_chroma) are imported inside
+# the functions below so that importing this module stays cheap. They are only
+# paid for on the first request that needs them, or by the startup warm-up.
+
+# "bedrock" (default) or "simulation" for deterministic in-process fake embeddings
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "bedrock").lower()
+
+if EMBEDDINGS_PROVIDER == "simulation":
+    EMBEDDING_MODEL_ID = "simulation-hash-v1"
+else:
+    EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
 
 #LRU cache for Global Embedding
 @lru_cache()
 def get_embeddings():
-    return BedrockEmbeddings(
-        model_id="amazon.titan-embed-text-v2:0",
-        region_name=os.getenv("AWS_REGION", "us-east-2"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-chroma_client = PersistentClient(path=CHROMA_DIR)
+    from utils.embedding_cache import CachedQueryEmbeddings, query_embedding_cache, QUERY_EMBED_CACHE_PATH
+
+    if QUERY_EMBED_CACHE_PATH:
+        query_embedding_cache.load(QUERY_EMBED_CACHE_PATH)
+
+    if EMBEDDINGS_PROVIDER == "simulation":
+        from utils.simulation import SimulatedEmbeddings
+
+        inner = SimulatedEmbeddings()
+    else:
+        from langchain_aws import BedrockEmbeddings
+
+        inner = BedrockEmbeddings(
+            model_id=EMBEDDING_MODEL_ID,
+            region_name=os.getenv("AWS_REGION", "us-east-2"),
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        )
+    # Query embeddings are served from a shared exact-match cache.
+    return CachedQueryEmbeddings(inner, model_id=EMBEDDING_MODEL_ID)
+
+
+def persist_query_cache():
+    """Save the query embedding cache if persistence is enabled and it was used."""
+    if get_embeddings.cache_info().currsize == 0:
+        return
+    from utils.embedding_cache import query_embedding_cache, QUERY_EMBED_CACHE_PATH
+
+    if QUERY_EMBED_CACHE_PATH:
+        query_embedding_cache.save(QUERY_EMBED_CACHE_PATH)
+
+
+# Memory budget for loaded vector indexes, enforced by utils.residency through
+# recycle_chroma_client. It is also passed to Chroma's LRU segment cache, which
+# only the Python segment manager (chromadb < 1.0) honours; the Rust bindings
+# used by PersistentClient on 1.x ignore it.
+INDEX_MEMORY_BUDGET_MB = int(os.getenv("INDEX_MEMORY_BUDGET_MB", "0"))
+
+
+@lru_cache()
+def get_chroma_client():
+    """Open the persistent Chroma client on first access."""
+    from chromadb import PersistentClient
+
+    if INDEX_MEMORY_BUDGET_MB:
+        from chromadb.config import Settings
+
+        settings = Settings(
+            chroma_segment_cache_policy="LRU",
+            chroma_memory_limit_bytes=INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+        )
+        return PersistentClient(path=CHROMA_DIR, settings=settings)
+
+    return PersistentClient(path=CHROMA_DIR)
+
 
 collection_cache = {}
 
-db_cache = {}
+# Chroma wrapper instances, most recently used last
+db_cache = OrderedDict()
+DB_CACHE_SIZE = 100
+
+# Both caches are cleared from the residency sweep and from deletes while
+# request threads read them; every access goes through this lock.
+_cache_lock = threading.Lock()
+
+def _touch(collection_name: str):
+    # Records the access and transparently reloads collections moved to cold
+    # storage. The first access can restore a whole snapshot, so async handlers
+    # must call get_cached_db/get_rag_collection through run_in_threadpool.
+    from utils.residency import residency_manager
+
+    residency_manager.touch(collection_name)
+
 
 def get_rag_collection(rag_id: str):
-    if rag_id in collection_cache:
-        return collection_cache[rag_id]
-    
-    collection = chroma_client.get_or_create_collection(
+    _touch(rag_id)
+    with _cache_lock:
+        collection = collection_cache.get(rag_id)
+    if collection is not None:
+        return collection
+
+    client = get_chroma_client()
+    collection = client.get_or_create_collection(
         name=rag_id,
         metadata={"hnsw:space": "cosine"},
     )
 
-    collection_cache[rag_id] = collection
+    # Don't cache a handle on a client recycled in the meantime
+    with _cache_lock:
+        if client is get_chroma_client():
+            collection_cache[rag_id] = collection
     return collection
 
 
 # Cache DB wrapper instances
-@lru_cache(maxsize=100)
 def get_cached_db(collection_name: str):
     """Get or create a cached Chroma DB instance"""
+    _touch(collection_name)
+    with _cache_lock:
+        db = db_cache.get(collection_name)
+        if db is not None:
+            db_cache.move_to_end(collection_name)
+            return db
+
+    from langchain_chroma import Chroma
+
     embeddings = get_embeddings()
-    return Chroma(
-        client=chroma_client,
+    client = get_chroma_client()
+    db = Chroma(
+        client=client,
         collection_name=collection_name,
         embedding_function=embeddings
     )
+    with _cache_lock:
+        if client is get_chroma_client():
+            db_cache[collection_name] = db
+        while len(db_cache) > DB_CACHE_SIZE:
+            db_cache.popitem(last=False)
+    return db
+
+
+def forget_collection(collection_name: str):
+    """Drop cached handles for a collection (after it is deleted or replaced)."""
+    with _cache_lock:
+        collection_cache.pop(collection_name, None)
+        db_cache.pop(collection_name, None)
+
+
+def drop_collection(collection_name: str) -> bool:
+    """Delete a collection through the Chroma API, freeing its vectors and index files."""
+    forget_collection(collection_name)
+    try:
+        get_chroma_client().delete_collection(collection_name)
+    except Exception as e:
+        # Chroma raises ValueError/NotFoundError depending on version
+        print(f"Collection {collection_name} not deleted: {e}")
+        return False
+    return True
+
+
+# chromadb versions whose SharedSystemClient internals recycle_chroma_client
+# relies on: [min, max)
+CHROMA_RECYCLE_VERSIONS = ((0, 5), (2, 0))
+
+
+@lru_cache()
+def chroma_recycle_supported() -> bool:
+    """Whether this chromadb exposes the internals needed to recycle the client."""
+    try:
+        import chromadb
+        from chromadb.api.client import SharedSystemClient
+
+        version = tuple(int(part) for part in chromadb.__version__.split(".")[:2])
+    except Exception as e:
+        print(f"Chroma client recycling disabled: {e}")
+        return False
+
+    low, high = CHROMA_RECYCLE_VERSIONS
+    if not low <= version < high:
+        print(f"Chroma client recycling disabled: chromadb {chromadb.__version__} is not a supported version")
+        return False
+    if not (isinstance(getattr(SharedSystemClient, "_identifier_to_system", None), dict)
+            and callable(getattr(SharedSystemClient, "_get_identifier_from_settings", None))):
+        print("Chroma client recycling disabled: SharedSystemClient internals not found")
+        return False
+    return True
+
+
+def recycle_chroma_client() -> bool:
+    """
+    Drop the Chroma client and every cached handle so the indexes it loaded can
+    be freed. Chroma has no per-collection unload, so this is the only way to
+    release HNSW memory short of deleting a collection.
+
+    The shared System is forgotten, not stopped: requests still holding the old
+    client finish on it, and it is freed with the last reference. Until then two
+    Chroma instances have the same persist directory open in this process, which
+    chromadb does not officially support; writers are held off by the residency
+    manager, so the old instance only serves reads. Set RESIDENCY_RECYCLE=0 to
+    disable recycling.
+
+    Does nothing and returns False on chromadb versions outside
+    CHROMA_RECYCLE_VERSIONS or without the expected internals.
+    """
+    if not chroma_recycle_supported():
+        return False
+
+    with _cache_lock:
+        collection_cache.clear()
+        db_cache.clear()
+    if get_chroma_client.cache_info().currsize == 0:
+        return False
+
+    client = get_chroma_client()
+    get_chroma_client.cache_clear()
+    try:
+        from chromadb.api.client import SharedSystemClient
+
+        identifier = SharedSystemClient._get_identifier_from_settings(client.get_settings())
+        SharedSystemClient._identifier_to_system.pop(identifier, None)
+    except Exception as e:
+        # The next PersistentClient reuses the old System, so nothing was released
+        print(f"Could not release the Chroma system: {e}")
+        return False
+    del client
+    gc.collect()
+    return True
+
+
+def warm_up():
+    """Import provider SDKs and open shared clients ahead of the first request."""
+    if EMBEDDINGS_PROVIDER != "simulation":
+        import langchain_aws  # noqa: F401
+        import langchain_openai  # noqa: F401
+    import langchain_community.document_loaders  # noqa: F401
+
+    get_chroma_client()
+    get_embeddings()
+    print("Warm-up complete: providers imported, Chroma client opened")
@@ -0,0 +1,441 @@
+import os
+import resource
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from db.crud import (
+    get_residency,
+    record_residency_access,
+    set_residency_tier,
+    set_residency_size,
+    delete_residency,
+    get_cold_candidates,
+    get_untracked_collections,
+)
+from utils.rag_utilities import (
+    INDEX_MEMORY_BUDGET_MB,
+    EMBEDDING_MODEL_ID,
+    chroma_recycle_supported,
+    get_chroma_client,
+    drop_collection,
+    recycle_chroma_client,
+)
+
+# Collection residency: tracks which collections the current Chroma client has
+# loaded, releases them when they go idle or exceed the index memory budget,
+# and moves RAGs untouched for COLD_AFTER_DAYS into compressed snapshots on
+# disk. A cold RAG is restored by the next get_cached_db/get_rag_collection.
+#
+# Chroma cannot unload a single collection: once queried, its HNSW index stays
+# in the client's segment cache (on 1.x that cache is sized by the open-file
+# limit, not by memory). Releasing therefore means recycling the whole client,
+# which frees every loaded index; collections still in use are reloaded on
+# their next access. Recycling is skipped while an ingest, import or restore is
+# writing, and the cold tier is what removes a RAG from Chroma entirely.
+#
+# Recycling uses chromadb internals (see recycle_chroma_client) and is disabled
+# automatically on unsupported versions; /rag/admin/residency reports whether
+# it is active. While a recycle drains, two Chroma instances have chroma_data
+# open in this process. Set RESIDENCY_RECYCLE=0 if that is not acceptable.
+
+RESIDENCY_IDLE_SECONDS = int(os.getenv("RESIDENCY_IDLE_SECONDS", "900"))
+RESIDENCY_SWEEP_SECONDS = int(os.getenv("RESIDENCY_SWEEP_SECONDS", "60"))
+# 0 disables client recycling (idle indexes then stay loaded until restart)
+RESIDENCY_RECYCLE = os.getenv("RESIDENCY_RECYCLE", "1") == "1"
+# 0 disables cold storage
+COLD_AFTER_DAYS = float(os.getenv("COLD_AFTER_DAYS", "0"))
+COLD_DIR = "./cold_data"
+
+# Rough per-vector cost of a loaded HNSW index beyond the raw float32 vector
+HNSW_LINK_BYTES = 16 * 8 + 64
+
+
+def estimate_index_bytes(vectors: int, dim: int) -> int:
+    return vectors * (dim * 4 + HNSW_LINK_BYTES)
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class ResidentCollection:
+    name: str
+    loaded_at: float
+    last_access: float
+    vectors: int = 0
+    est_bytes: int = 0
+
+
+def _latency_summary(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class CollectionResidencyManager:
+    def __init__(
+        self,
+        budget_bytes: int = INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+        idle_seconds: int = RESIDENCY_IDLE_SECONDS,
+        cold_after_days: float = COLD_AFTER_DAYS,
+    ):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.cold_after_days = cold_after_days
+
+        self._resident: OrderedDict[str, ResidentCollection] = OrderedDict()
+        self._dirty_access: dict[str, float] = {}
+        self._collection_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self.load_latencies = deque(maxlen=1000)
+        self.restore_latencies = deque(maxlen=200)
+        self.counters = {
+            "loads": 0,
+            "recycles": 0,
+            "collections_released": 0,
+            "bytes_released_est": 0,
+            "recycles_deferred": 0,
+            "cold_demotions": 0,
+            "cold_restores": 0,
+        }
+        self.last_recycle = time.time()
+        self._writers = 0
+        self._recycling = False
+        # Writers wait on this while a recycle is swapping the client
+        self._recycle_done = threading.Condition(self._lock)
+
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _collection_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._collection_locks.setdefault(name, threading.Lock())
+
+    def _mark_access(self, entry: ResidentCollection, now: float):
+        entry.last_access = now
+        self._resident.move_to_end(entry.name)
+        self._dirty_access[entry.name] = now
+
+    def touch(self, name: str):
+        """Record an access; load (or restore from cold storage) on first use."""
+        now = time.time()
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None:
+                self._mark_access(entry, now)
+                return
+
+        with self._collection_lock(name):
+            with self._lock:
+                entry = self._resident.get(name)
+                if entry is not None:
+                    self._mark_access(entry, now)
+                    return
+
+            start = time.perf_counter()
+            row = get_residency(name)
+            if row is not None and row.tier == "cold":
+                self._restore(name, row)
+            vectors, est_bytes = self._estimate(name)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                entry = ResidentCollection(name=name, loaded_at=now, last_access=now,
+                                           vectors=vectors, est_bytes=est_bytes)
+                self._resident[name] = entry
+                self._mark_access(entry, now)
+                self.load_latencies.append(elapsed)
+                self.counters["loads"] += 1
+
+        if self.budget_bytes and self.resident_bytes() > self.budget_bytes:
+            self._wake.set()
+
+    @contextmanager
+    def writing(self):
+        """Hold off client recycling while vectors are being written."""
+        with self._lock:
+            while self._recycling:
+                self._recycle_done.wait()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+
+    def _estimate(self, name: str):
+        """
+        Vector count and estimated resident bytes of a collection's index.
+
+        Opens the collection, so only call it for collections that are being
+        loaded anyway (touch, sweep of accessed ones). The result is recorded
+        so storage_info can answer without opening anything.
+        """
+        try:
+            collection = get_chroma_client().get_collection(name)
+            vectors = collection.count()
+            dim = None
+            if vectors:
+                sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+                dim = len(sample[0]) if sample is not None and len(sample) else None
+        except Exception:
+            # Not created yet (first ingest) or unreadable
+            return 0, 0
+        self.record_size(name, vectors, dim)
+        return vectors, estimate_index_bytes(vectors, dim or 0)
+
+    def record_size(self, name: str, vectors: int, dim: int | None):
+        """Called by ingest/import/restore after writing vectors."""
+        try:
+            set_residency_size(name, vectors, dim)
+        except Exception as e:
+            print(f"Could not record size of {name}: {e}")
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.est_bytes for entry in self._resident.values())
+
+    def recycle_enabled(self) -> bool:
+        return RESIDENCY_RECYCLE and chroma_recycle_supported()
+
+    def recycle(self) -> bool:
+        """Release every loaded index by recycling the Chroma client."""
+        if not self.recycle_enabled():
+            return False
+
+        with self._lock:
+            if self._writers or self._recycling:
+                self.counters["recycles_deferred"] += 1
+                return False
+            # New writers wait until the client has been swapped
+            self._recycling = True
+            released, self._resident = self._resident, OrderedDict()
+
+        # Outside the manager lock: the swap ends in gc.collect(), which must not block touch()
+        try:
+            recycled = recycle_chroma_client()
+        finally:
+            with self._lock:
+                self._recycling = False
+                self._recycle_done.notify_all()
+
+        with self._lock:
+            if not recycled:
+                # Nothing was released; keep accounting for what is still loaded
+                for name, entry in released.items():
+                    self._resident.setdefault(name, entry)
+                return False
+            self.last_recycle = time.time()
+            self.counters["recycles"] += 1
+            self.counters["collections_released"] += len(released)
+            self.counters["bytes_released_est"] += sum(e.est_bytes for e in released.values())
+        print(f"Recycled Chroma client, released {len(released)} loaded collections")
+        return True
+
+    def _should_recycle(self, now: float) -> bool:
+        with self._lock:
+            if not self._resident:
+                return False
+            resident = sum(e.est_bytes for e in self._resident.values())
+            idle = [e for e in self._resident.values() if now - e.last_access > self.idle_seconds]
+            idle_bytes = sum(e.est_bytes for e in idle)
+        if self.budget_bytes and resident > self.budget_bytes:
+            # Over budget: recycle if something is idle, otherwise at most once per idle period
+            return bool(idle) or now - self.last_recycle > self.idle_seconds
+        # Worth reloading the active collections when idle ones hold at least half the memory
+        return bool(idle) and idle_bytes * 2 >= resident
+
+    # COLD STORAGE
+    def _cold_path(self, name: str) -> str:
+        return os.path.join(COLD_DIR, f"{name}.tar.gz")
+
+    def _demote(self, name: str):
+        """Write a compressed snapshot of the collection, then drop it from Chroma."""
+        from utils.snapshot import iter_snapshot
+
+        try:
+            collection = get_chroma_client().get_collection(name)
+        except Exception:
+            return False
+
+        os.makedirs(COLD_DIR, exist_ok=True)
+        path = self._cold_path(name)
+        tmp_path = f"{path}.tmp"
+        with self.writing():
+            with open(tmp_path, "wb") as f:
+                for chunk in iter_snapshot(collection, {}, EMBEDDING_MODEL_ID, portable=False):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+
+            # Tier is recorded before the drop, so a crash in between leaves a
+            # restorable state (restoring into an existing collection is an upsert)
+            set_residency_tier(name, "cold", path, os.path.getsize(path), collection.count())
+            with self._lock:
+                self._resident.pop(name, None)
+            drop_collection(name)
+        self.counters["cold_demotions"] += 1
+        print(f"Moved idle collection {name} to cold storage: {path}")
+        return True
+
+    def _restore(self, name: str, row):
+        from utils.snapshot import read_manifest, load_snapshot_batches
+
+        start = time.perf_counter()
+        with self.writing(), open(row.cold_path, "rb") as f:
+            tar, manifest = read_manifest(f)
+            collection = get_chroma_client().get_or_create_collection(
+                name=name,
+                metadata=manifest.get("collection_metadata") or {"hnsw:space": "cosine"},
+            )
+            loaded, dim = load_snapshot_batches(tar, collection)
+
+        set_residency_tier(name, "hot")
+        self.record_size(name, loaded, dim)
+        os.remove(row.cold_path)
+        self.restore_latencies.append(time.perf_counter() - start)
+        self.counters["cold_restores"] += 1
+        print(f"Restored collection {name} from cold storage")
+
+    def forget(self, name: str):
+        """Drop all residency state and cold data for a deleted collection."""
+        with self._lock:
+            self._resident.pop(name, None)
+            self._dirty_access.pop(name, None)
+        row = get_residency(name)
+        if row is not None and row.cold_path and os.path.exists(row.cold_path):
+            os.remove(row.cold_path)
+        delete_residency(name)
+
+    def storage_info(self, name: str) -> dict:
+        """
+        Tier, vector count and estimated index size from recorded sizes.
+
+        Never opens the collection: doing so would load its index behind the
+        manager's back. Sizes of collections written before sizes were recorded
+        are None until their next access.
+        """
+        row = get_residency(name)
+        if row is not None and row.tier == "cold":
+            return {"tier": "cold", "vectors": row.cold_vectors or 0,
+                    "index_bytes_est": 0, "cold_bytes": row.cold_bytes or 0}
+        if row is not None and row.vectors is not None:
+            return {"tier": "hot", "vectors": row.vectors,
+                    "index_bytes_est": estimate_index_bytes(row.vectors, row.dim or 0), "cold_bytes": 0}
+        with self._lock:
+            entry = self._resident.get(name)
+        if entry is not None:
+            return {"tier": "hot", "vectors": entry.vectors, "index_bytes_est": entry.est_bytes, "cold_bytes": 0}
+        return {"tier": "hot", "vectors": None, "index_bytes_est": None, "cold_bytes": 0}
+
+    # MAINTENANCE
+    def sweep(self):
+        now = time.time()
+
+        with self._lock:
+            accesses, self._dirty_access = self._dirty_access, {}
+
+        # Collections touched before they existed, or grown by an ingest since
+        # they were loaded, get a fresh size estimate
+        for name in accesses:
+            with self._lock:
+                entry = self._resident.get(name)
+            if entry is not None:
+                entry.vectors, entry.est_bytes = self._estimate(name)
+
+        if self._should_recycle(now):
+            self.recycle()
+
+        # RAGs never touched since tracking started count as accessed now
+        accesses.update({name: now for name in get_untracked_collections() if name not in accesses})
+        record_residency_access(accesses)
+
+        if self.cold_after_days > 0:
+            cutoff = now - self.cold_after_days * 86400
+            for name in get_cold_candidates(cutoff):
+                with self._collection_lock(name):
+                    with self._lock:
+                        if name in self._resident and self._resident[name].last_access >= cutoff:
+                            continue
+                    try:
+                        self._demote(name)
+                    except Exception as e:
+                        print(f"Cold demotion of {name} failed: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(RESIDENCY_SWEEP_SECONDS)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Residency sweep failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="residency", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            accesses, self._dirty_access = self._dirty_access, {}
+        record_residency_access(accesses)
+
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._lock:
+            resident = [
+                {
+                    "collection": e.name,
+                    "vectors": e.vectors,
+                    "est_bytes": e.est_bytes,
+                    "idle_s": round(now - e.last_access, 1),
+                }
+                for e in reversed(self._resident.values())
+            ]
+        return {
+            "budget_bytes": self.budget_bytes,
+            # Collections loaded by the current Chroma client; estimated, and
+            # freed only by a recycle or cold demotion
+            "resident_bytes_est": sum(r["est_bytes"] for r in resident),
+            "resident_count": len(resident),
+            "process_rss_bytes": _rss_bytes(),
+            "active_writers": self._writers,
+            "recycle_enabled": self.recycle_enabled(),
+            "last_recycle_s_ago": round(now - self.last_recycle, 1),
+            "idle_seconds": self.idle_seconds,
+            "cold_after_days": self.cold_after_days,
+            "counters": dict(self.counters),
+            "load_latency": _latency_summary(self.load_latencies),
+            "cold_restore_latency": _latency_summary(self.restore_latencies),
+            "resident": resident,
+        }
+
+
+residency_manager = CollectionResidencyManager()
@@ -0,0 +1,57 @@
+import os
+
+# Adaptive retrieval: fetch up to k_max scored candidates, keep the ones above
+# the relevance threshold, and stop adding chunks once they fall well below the
+# best hit. When nothing clears the threshold the caller can skip the LLM.
+
+RETRIEVAL_K_MIN = int(os.getenv("RETRIEVAL_K_MIN", "1"))
+RETRIEVAL_K_MAX = int(os.getenv("RETRIEVAL_K_MAX", "8"))
+RETRIEVAL_K_LIMIT = 20
+# Relevance scores are normalized to [0, 1] by the vector store (1 = identical)
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.3"))
+# Chunks scoring below this fraction of the best hit add little and are dropped
+RELATIVE_SCORE_CUTOFF = float(os.getenv("RELATIVE_SCORE_CUTOFF", "0.8"))
+
+NO_RELEVANT_DOCUMENTS = "No relevant documents were found in this RAG for your question."
+
+
+def retrieval_settings(request=None):
+    """Resolve (k_min, k_max, threshold) from env defaults and optional request overrides."""
+    k_min = getattr(request, "k_min", None) or RETRIEVAL_K_MIN
+    k_max = getattr(request, "k_max", None) or RETRIEVAL_K_MAX
+    threshold = getattr(request, "score_threshold", None)
+    if threshold is None:
+        threshold = RELEVANCE_THRESHOLD
+
+    k_max = max(1, min(k_max, RETRIEVAL_K_LIMIT))
+    k_min = max(1, min(k_min, k_max))
+    return k_min, k_max, threshold
+
+
+def select_relevant(scored_docs, k_min: int, threshold: float):
+    """Pick the dynamic-k subset of (doc, score) pairs, best first."""
+    relevant = sorted(
+        [(doc, score) for doc, score in scored_docs if score >= threshold],
+        key=lambda pair: pair[1],
+        reverse=True,
+    )
+    if not relevant:
+        return []
+
+    best = relevant[0][1]
+    return [
+        (doc, score) for i, (doc, score) in enumerate(relevant)
+        if i < k_min or score >= best * RELATIVE_SCORE_CUTOFF
+    ]
+
+
+async def adaptive_retrieve(db, query: str, where: dict | None = None, request=None):
+    """Scored similarity search with a relevance threshold and dynamic k."""
+    k_min, k_max, threshold = retrieval_settings(request)
+
+    search_kwargs = {"k": k_max}
+    if where:
+        search_kwargs["filter"] = where
+
+    scored_docs = await db.asimilarity_search_with_relevance_scores(query, **search_kwargs)
+    return select_relevant(scored_docs, k_min, threshold)
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# In-process fake providers for load testing and capacity planning.
+# Enabled with EMBEDDINGS_PROVIDER=simulation / LLM_PROVIDER=simulation, or by
+# creating a RAG with Model="simulation". No network calls are made.
+
+SIM_EMBEDDING_DIM = int(os.getenv("SIM_EMBEDDING_DIM", "256"))
+SIM_EMBED_LATENCY_MS = float(os.getenv("SIM_EMBED_LATENCY_MS", "0"))
+SIM_LLM_LATENCY_MS = float(os.getenv("SIM_LLM_LATENCY_MS", "300"))
+SIM_LLM_TOKENS_PER_SECOND = float(os.getenv("SIM_LLM_TOKENS_PER_SECOND", "50"))
+SIM_LLM_OUTPUT_TOKENS = int(os.getenv("SIM_LLM_OUTPUT_TOKENS", "60"))
+
+_WORD = re.compile(r"\w+")
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class SimulatedEmbeddings(Embeddings):
+    """Deterministic feature-hashing embeddings.
+
+    Each word is hashed into one of `dim` buckets, so texts that share words get
+    similar unit vectors and relevance thresholds behave realistically.
+    """
+
+    def __init__(self, dim: int = SIM_EMBEDDING_DIM, latency_ms: float = SIM_EMBED_LATENCY_MS):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+
+class SimulatedChatModel(BaseChatModel):
+    """Fake chat model with a fixed first-token latency and a token streaming rate."""
+
+    latency_ms: float = SIM_LLM_LATENCY_MS
+    tokens_per_second: float = SIM_LLM_TOKENS_PER_SECOND
+    output_tokens: int = SIM_LLM_OUTPUT_TOKENS
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulation"
+
+    def _tokens(self, messages: List[BaseMessage]) -> list[str]:
+        prompt = " ".join(str(m.content) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        # Deterministic answer per prompt
+        return [f"tok{digest[i % len(digest)]}" for i in range(self.output_tokens)]
+
+    def _usage(self, messages: List[BaseMessage]) -> dict:
+        input_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": input_tokens + self.output_tokens,
+        }
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency_ms / 1000 + self._token_delay() * len(tokens))
+        message = AIMessage(content=" ".join(tokens), usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency_ms / 1000 + self._token_delay() * len(tokens))
+        message = AIMessage(content=" ".join(tokens), usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for token in self._tokens(messages):
+            time.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import tarfile
+import time
+
+# RAG snapshot format: a gzip'd tar stream containing
+#   manifest.json            format version, embedding model, counts, RAG config
+#   batches/00000.npy        float32 embeddings, shape (n, dim)
+#   batches/00000.json       ids, documents and metadatas for the same rows
+#   ...
+# Batches are written and read one at a time, so neither export nor import
+# has to hold the whole collection in memory, and import needs no embedding calls.
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_BATCH_SIZE = 1000
+
+# Chunk metadata holding the uploaded file's local path (rag_data/<user>/<rag>/...)
+PATH_METADATA_KEYS = ("source", "file_path")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by the export generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name=name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _rewrite_paths(metadatas: list, directory: str | None) -> list:
+    """Reduce local file paths in chunk metadata to the file name, under `directory` if given."""
+    for metadata in metadatas:
+        for key in PATH_METADATA_KEYS:
+            if metadata and isinstance(metadata.get(key), str):
+                name = os.path.basename(metadata[key])
+                metadata[key] = os.path.join(directory, name) if directory else name
+    return metadatas
+
+
+def iter_snapshot(collection, config: dict, embedding_model: str, batch_size: int = SNAPSHOT_BATCH_SIZE,
+                  portable: bool = True):
+    """
+    Yield a snapshot of `collection` as gzip'd tar bytes, one batch at a time.
+
+    Portable snapshots (exports) keep only file names in chunk metadata, so no
+    owner ids or local paths leave the server.
+    """
+    import numpy as np
+
+    buffer = _StreamBuffer()
+    total = collection.count()
+
+    with tarfile.open(fileobj=buffer, mode="w|gz") as tar:
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "embedding_model": embedding_model,
+            "collection_metadata": collection.metadata or {},
+            "count": total,
+            "batch_size": batch_size,
+            "config": config,
+        }
+        _add_bytes(tar, "manifest.json", json.dumps(manifest).encode("utf-8"))
+        yield buffer.drain()
+
+        for batch_no, offset in enumerate(range(0, total, batch_size)):
+            rows = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset,
+            )
+            embeddings = np.asarray(rows["embeddings"], dtype=np.float32)
+            npy = io.BytesIO()
+            np.save(npy, embeddings, allow_pickle=False)
+
+            _add_bytes(tar, f"batches/{batch_no:05d}.npy", npy.getvalue())
+            _add_bytes(tar, f"batches/{batch_no:05d}.json", json.dumps({
+                "ids": rows["ids"],
+                "documents": rows["documents"],
+                "metadatas": _rewrite_paths(rows["metadatas"], None) if portable else rows["metadatas"],
+            }).encode("utf-8"))
+            yield buffer.drain()
+
+    # Closing the tar writes the end-of-archive blocks and gzip trailer
+    yield buffer.drain()
+
+
+def read_manifest(fileobj) -> tuple[tarfile.TarFile, dict]:
+    """Open a snapshot stream and read its manifest (always the first member)."""
+    tar = tarfile.open(fileobj=fileobj, mode="r|gz")
+    member = tar.next()
+    if member is None or member.name != "manifest.json":
+        raise SnapshotError("Snapshot is missing manifest.json")
+
+    manifest = json.loads(tar.extractfile(member).read())
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {manifest.get('format_version')}")
+    return tar, manifest
+
+
+def load_snapshot_batches(tar: tarfile.TarFile, collection, source_dir: str | None = None) -> tuple[int, int | None]:
+    """
+    Bulk-load the remaining batches of an open snapshot into `collection`.
+    Returns (rows loaded, embedding dimension or None when empty).
+
+    With `source_dir`, file paths in chunk metadata are pointed at that directory.
+    """
+    import numpy as np
+
+    loaded = 0
+    dim = None
+    embeddings = None
+
+    for member in tar:
+        if member.name == "manifest.json":
+            continue  # already read by read_manifest
+        data = tar.extractfile(member).read()
+
+        if member.name.endswith(".npy"):
+            embeddings = np.load(io.BytesIO(data), allow_pickle=False)
+            if embeddings.ndim == 2 and len(embeddings):
+                dim = embeddings.shape[1]
+            continue
+
+        if member.name.endswith(".json"):
+            if embeddings is None:
+                raise SnapshotError(f"{member.name} has no matching embeddings")
+            rows = json.loads(data)
+            if len(rows["ids"]) != len(embeddings):
+                raise SnapshotError(f"{member.name} row count does not match embeddings")
+
+            if rows["ids"]:
+                collection.upsert(
+                    ids=rows["ids"],
+                    embeddings=embeddings,
+                    documents=rows["documents"],
+                    metadatas=_rewrite_paths(rows["metadatas"], source_dir) if source_dir else rows["metadatas"],
+                )
+            loaded += len(rows["ids"])
+            embeddings = None
+
+    return loaded, dim
@@ -0,0 +1,207 @@
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+from db.crud import BASE_DIR, CHROMA_DIR, get_residency
+from db.database import SessionLocal
+from db.models import Rag_Table
+from utils.rag_utilities import get_chroma_client, drop_collection
+from utils.residency import COLD_DIR, residency_manager
+
+# Storage lifecycle for RAGs: per-RAG purge after deletion and a garbage
+# collector that reconciles rag_table, the rag_data file tree and the Chroma
+# collections, reclaiming anything that no longer has an owner.
+
+# RAGs bigger than this on disk are purged in a background task
+BACKGROUND_DELETE_BYTES = int(os.getenv("BACKGROUND_DELETE_BYTES", str(50 * 1024 * 1024)))
+
+# Directories, collections and segments younger than this are never treated as
+# orphans: create/import write storage before their rag_table row exists
+GC_MIN_AGE_SECONDS = int(os.getenv("GC_MIN_AGE_SECONDS", str(6 * 3600)))
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+class CompactionError(Exception):
+    """The Chroma sqlite file could not be vacuumed (usually locked by a writer)."""
+
+
+def collection_name_for(user_id: str, rag_id: str) -> str:
+    return f"{user_id}_{rag_id}"
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def rag_storage_bytes(user_id: str, rag_id: str) -> int:
+    return dir_size(os.path.join(BASE_DIR, user_id, rag_id))
+
+
+def purge_rag_storage(user_id: str, rag_id: str):
+    """Remove a RAG's vectors and uploaded files. Returns (files_deleted, chroma_deleted)."""
+    name = collection_name_for(user_id, rag_id)
+    chroma_deleted = drop_collection(name)
+    # Cold-tier snapshot and residency row, if any
+    residency_manager.forget(name)
+
+    rag_dir = os.path.join(BASE_DIR, user_id, rag_id)
+    if os.path.exists(rag_dir):
+        shutil.rmtree(rag_dir, ignore_errors=True)
+        print(f"Deleted user RAG data directory: {rag_dir}")
+        files_deleted = True
+    else:
+        files_deleted = False
+
+    return files_deleted, chroma_deleted
+
+
+def _is_recent(path: str, now: float, min_age: int) -> bool:
+    try:
+        return now - os.path.getmtime(path) < min_age
+    except OSError:
+        return False
+
+
+def _collection_names():
+    # list_collections returns names on Chroma >= 0.6 and Collection objects before
+    return [getattr(c, "name", c) for c in get_chroma_client().list_collections()]
+
+
+def _referenced_segment_ids(sqlite_path: str) -> set[str] | None:
+    if not os.path.exists(sqlite_path):
+        return None
+    with sqlite3.connect(sqlite_path) as conn:
+        return {row[0] for row in conn.execute("SELECT id FROM segments")}
+
+
+def compact_chroma(sqlite_path: str | None = None):
+    """VACUUM the Chroma sqlite file so space freed by deleted collections is returned."""
+    sqlite_path = sqlite_path or os.path.join(CHROMA_DIR, "chroma.sqlite3")
+    if not os.path.exists(sqlite_path):
+        return 0
+    before = os.path.getsize(sqlite_path)
+    conn = sqlite3.connect(sqlite_path, timeout=5)
+    try:
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        raise CompactionError(f"Could not compact {sqlite_path}: {e}. Retry when no ingest is running.")
+    finally:
+        conn.close()
+    return before - os.path.getsize(sqlite_path)
+
+
+def run_gc(dry_run: bool = False, compact: bool = False, min_age: int = GC_MIN_AGE_SECONDS):
+    """
+    Reconcile rag_table, rag_data/<user>/<rag> and Chroma collections.
+
+    Orphaned directories, collections and cold-tier snapshots (no rag_table row)
+    are deleted, as are vector segment directories no longer referenced by Chroma. Rows whose data
+    is missing are only reported. Anything modified within `min_age` seconds is
+    skipped, so a RAG that is still being created or imported is left alone.
+    """
+    now = time.time()
+    with SessionLocal() as session:
+        known = {(r.user_id, r.rag_id) for r in session.query(Rag_Table.user_id, Rag_Table.rag_id).all()}
+
+    report = {
+        "dry_run": dry_run,
+        "orphan_dirs": [],
+        "orphan_collections": [],
+        "orphan_segments": [],
+        "orphan_cold_files": [],
+        "rows_without_collection": [],
+        "skipped_recent": [],
+        "bytes_reclaimed": 0,
+    }
+
+    # 1. File tree
+    if os.path.isdir(BASE_DIR):
+        for user_id in os.listdir(BASE_DIR):
+            user_dir = os.path.join(BASE_DIR, user_id)
+            if not os.path.isdir(user_dir):
+                continue
+            for rag_id in os.listdir(user_dir):
+                rag_dir = os.path.join(user_dir, rag_id)
+                if not os.path.isdir(rag_dir) or (user_id, rag_id) in known:
+                    continue
+                if _is_recent(rag_dir, now, min_age):
+                    report["skipped_recent"].append(rag_dir)
+                    continue
+                report["orphan_dirs"].append(rag_dir)
+                report["bytes_reclaimed"] += dir_size(rag_dir)
+                if not dry_run:
+                    shutil.rmtree(rag_dir, ignore_errors=True)
+            if not dry_run and not os.listdir(user_dir):
+                try:
+                    os.rmdir(user_dir)
+                except OSError:
+                    pass  # a new upload created a RAG dir in the meantime
+
+    # 2. Vector collections, named <user_id>_<rag_id>
+    names = set(_collection_names())
+    for name in names:
+        user_id, _, rag_id = name.partition("_")
+        if not (_UUID.match(user_id) and _UUID.match(rag_id)):
+            continue  # not created by this service
+        if (user_id, rag_id) not in known:
+            # Create and import make the RAG dir before the collection
+            if _is_recent(os.path.join(BASE_DIR, user_id, rag_id), now, min_age):
+                report["skipped_recent"].append(name)
+                continue
+            report["orphan_collections"].append(name)
+            if not dry_run:
+                drop_collection(name)
+
+    for user_id, rag_id in known:
+        name = collection_name_for(user_id, rag_id)
+        if name in names:
+            continue
+        residency = get_residency(name)
+        if residency is None or residency.tier != "cold":
+            report["rows_without_collection"].append(rag_id)
+
+    # Cold-tier snapshots, named <user_id>_<rag_id>.tar.gz
+    if os.path.isdir(COLD_DIR):
+        for entry in os.listdir(COLD_DIR):
+            user_id, _, rag_id = entry.removesuffix(".tmp").removesuffix(".tar.gz").partition("_")
+            if (user_id, rag_id) in known or _is_recent(os.path.join(COLD_DIR, entry), now, min_age):
+                continue
+            report["orphan_cold_files"].append(entry)
+            report["bytes_reclaimed"] += os.path.getsize(os.path.join(COLD_DIR, entry))
+            if not dry_run:
+                residency_manager.forget(collection_name_for(user_id, rag_id))
+                # Interrupted demotions leave .tmp files with no residency row
+                if os.path.exists(os.path.join(COLD_DIR, entry)):
+                    os.remove(os.path.join(COLD_DIR, entry))
+
+    # 3. HNSW segment directories left behind by deleted collections
+    sqlite_path = os.path.join(CHROMA_DIR, "chroma.sqlite3")
+    segment_ids = _referenced_segment_ids(sqlite_path)
+    if segment_ids is not None:
+        for entry in os.listdir(CHROMA_DIR):
+            path = os.path.join(CHROMA_DIR, entry)
+            if (os.path.isdir(path) and _UUID.match(entry) and entry not in segment_ids
+                    and not _is_recent(path, now, min_age)):
+                report["orphan_segments"].append(entry)
+                report["bytes_reclaimed"] += dir_size(path)
+                if not dry_run:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    if compact and not dry_run:
+        try:
+            report["bytes_reclaimed"] += compact_chroma(sqlite_path)
+        except CompactionError as e:
+            print(e)
+            report["compact_error"] = str(e)
+
+    return report